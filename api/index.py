@@ -1,169 +1,155 @@
-from fastapi import FastAPI, Body, Request
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+import contextvars
 import os
+import queue
 import sys
-import requests
-from pathlib import Path
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from typing import List, Optional
 import json
 from http.server import BaseHTTPRequestHandler
-import time
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from cache import ResultCache, cache_key
+import metrics
+
 # Load environment variables
 load_dotenv()
 
 # Hugging Face API configuration
 HF_API_TOKEN = os.environ.get("HF_API_TOKEN", "")  # Set this in your Vercel environment variables
-# Updated to more appropriate models for essay scoring
-SCORE_MODEL_API = "https://api-inference.huggingface.co/models/facebook/bart-large-mnli"
-FEEDBACK_MODEL_API = "https://api-inference.huggingface.co/models/facebook/bart-large-cnn"
 
-# Request/Response models
-class EssayRequest(BaseModel):
-    text: str
-    feedback_required: Optional[bool] = True
+from engine import FEEDBACK_SECTIONS, SCORE_CLASSES, Engine, EngineError, score_value
+from engine.remote import FEEDBACK_MODEL, FEEDBACK_UNAVAILABLE, SCORE_MODEL, RemoteBackend, label_for
+
+# Result cache - bump PROMPT_VERSION whenever the scoring labels or feedback prompts change
+PROMPT_VERSION = "2"
+result_cache = ResultCache()
+
+# The serverless function only has the remote backend; the engine's circuit breaker answers
+# with the fallback score right away while the Inference API keeps failing
+engine = Engine([RemoteBackend(HF_API_TOKEN)])
+
+# Score and feedback run side by side; the score is computed on the calling thread
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="analyze")
+_END = object()
+
+def has_valid_token():
+    return bool(HF_API_TOKEN) and HF_API_TOKEN != "your_hugging_face_api_token_here"
 
-class EssayResponse(BaseModel):
-    score: int
-    confidence: float
-    feedback: Optional[List[str]] = None
+def default_score():
+    """Score returned when no backend answers: an average essay at 50% confidence"""
+    label = label_for("average essay")
+    probs = [0.0] * len(SCORE_CLASSES)
+    probs[label] = 0.5
+    return label, 0.5, probs
+
+def score_key(text):
+    return cache_key(text, "score", SCORE_MODEL, PROMPT_VERSION)
+
+def feedback_key(text):
+    return cache_key(text, "feedback", FEEDBACK_MODEL, PROMPT_VERSION)
 
-# Prediction and feedback functions using Hugging Face API
 def predict_score(text):
-    """Predict the score using Hugging Face Inference API"""
-    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+    """Predict the (label, confidence, probabilities) of an essay through the scoring engine"""
+    if not has_valid_token():
+        return default_score()
     
-    # Check if API token is valid
-    if not HF_API_TOKEN or HF_API_TOKEN == "your_hugging_face_api_token_here":
-        print("WARNING: No valid Hugging Face API token found. Using mock scores.")
-        # Return informative mock data
-        return 3, 0.5, [0.1, 0.1, 0.2, 0.5, 0.1, 0.0]
+    key = score_key(text)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return tuple(cached)
     
-    # Wait for model to load if needed with a simple retry mechanism
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(
-                SCORE_MODEL_API, 
-                headers=headers, 
-                json={"inputs": text[:1000], "parameters": {"candidate_labels": ["poor essay", "average essay", "good essay", "excellent essay"]}}
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Check if we got a valid result
-                if isinstance(result, dict) and "scores" in result:
-                    # Map classification to score ranges (0-5)
-                    scores = result["scores"]
-                    labels = result["labels"]
-                    
-                    # Find the most confident classification
-                    best_idx = scores.index(max(scores))
-                    best_label = labels[best_idx]
-                    confidence = scores[best_idx]
-                    
-                    # Map labels to scores
-                    score_map = {
-                        "poor essay": 1,
-                        "average essay": 3,
-                        "good essay": 4,
-                        "excellent essay": 5
-                    }
-                    
-                    score = score_map.get(best_label, 3)
-                    
-                    # Create probabilities for visualization
-                    probs = [0.0] * 6  # Assuming scores 0-5
-                    probs[score] = confidence
-                    
-                    return score, confidence, probs
-                elif "error" in result and "currently loading" in result["error"]:
-                    # Model is still loading, wait and retry
-                    time.sleep(2)
-                    continue
-            
-            # For any other issues, return a default score with warning
-            print(f"Warning: API returned unexpected response. Status: {response.status_code}")
-            return 3, 0.5, [0.1, 0.1, 0.2, 0.5, 0.1, 0.0]
-        
-        except Exception as e:
-            print(f"Error in score prediction: {str(e)}")
-            # Try again after a delay
-            time.sleep(1)
+    try:
+        _, (result,) = engine.score([text])
+    except EngineError as e:
+        print(f"Error in score prediction: {str(e)}")
+        return default_score()
     
-    # If all retries failed, return default values with detailed message
-    print("Failed to get scores after multiple retries")
-    return 3, 0.5, [0.1, 0.1, 0.2, 0.5, 0.1, 0.0]
+    result_cache.set(key, list(result))
+    return result
 
-def generate_feedback(text):
-    """Generate feedback using Hugging Face Inference API"""
-    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+def feedback_sections(text):
+    """Yield (index, text) for each feedback section as it finishes, from the cache if possible"""
+    if not has_valid_token():
+        yield from enumerate(mock_feedback())
+        return
     
-    # Check if API token is valid
-    if not HF_API_TOKEN or HF_API_TOKEN == "your_hugging_face_api_token_here":
-        print("WARNING: No valid Hugging Face API token found. Using mock feedback.")
-        # Return informative mock data
-        return [
-            "Unable to analyze grammar. Please set up a valid API token.",
-            "Unable to analyze clarity. Please set up a valid API token.",
-            "Unable to analyze structure. Please set up a valid API token."
-        ]
+    cached = result_cache.get(feedback_key(text))
+    if cached is not None:
+        yield from enumerate(cached)
+        return
     
-    # Create prompts for different aspects of feedback
-    prompts = [
-        f"Identify grammar and spelling errors in this essay and provide specific suggestions for improvement: {text[:300]}",
-        f"Evaluate the clarity and coherence of this essay. What could be improved?: {text[:300]}",
-        f"Analyze the structure and organization of this essay and provide constructive feedback: {text[:300]}"
-    ]
-    
-    feedbacks = []
-    for prompt in prompts:
-        # Wait for model to load if needed with a simple retry mechanism
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    FEEDBACK_MODEL_API, 
-                    headers=headers, 
-                    json={"inputs": prompt, "parameters": {"max_length": 150}}
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Check if we got a result
-                    if isinstance(result, list) and len(result) > 0 and "generated_text" in result[0]:
-                        generated_text = result[0]["generated_text"]
-                        feedbacks.append(generated_text)
-                        break
-                    elif "error" in result and "currently loading" in result["error"]:
-                        # Model is still loading, wait and retry
-                        time.sleep(2)
-                        continue
-                
-                # For any other issues, add a default message
-                feedbacks.append("The feedback service is currently experiencing technical difficulties. Please try again later.")
-                break
-            
-            except Exception as e:
-                print(f"Error in feedback generation: {str(e)}")
-                # Try again after a delay
-                time.sleep(1)
-        
-        # If all retries failed for this prompt
-        if len(feedbacks) <= len(prompts) - 1:
-            feedbacks.append("Feedback service is currently unavailable. Please ensure your API token is correctly configured.")
+    feedbacks = [FEEDBACK_UNAVAILABLE] * len(FEEDBACK_SECTIONS)
+    complete = True
+    try:
+        for _, index, feedback, ok in engine.feedback_sections(text):
+            feedbacks[index] = feedback
+            complete = complete and ok
+            yield index, feedback
+    except EngineError as e:
+        print(f"Error in feedback generation: {str(e)}")
+        yield from enumerate(feedbacks)
+        return
     
+    # Don't cache fallback messages
+    if complete:
+        result_cache.set(feedback_key(text), feedbacks)
+
+def generate_feedback(text):
+    """Generate feedback for every section"""
+    feedbacks = [None] * len(FEEDBACK_SECTIONS)
+    for index, feedback in feedback_sections(text):
+        feedbacks[index] = feedback
     return feedbacks
 
+def _in_background(fn, *args):
+    """Run fn on the executor with the caller's context (and so its request timings)"""
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+def analyze(text, feedback_required=True):
+    """Score an essay and generate feedback concurrently"""
+    feedback = _in_background(generate_feedback, text) if feedback_required else None
+    return predict_score(text), (feedback.result() if feedback is not None else None)
+
+def analyze_events(text, feedback_required=True):
+    """Yield ("score", ...) as soon as the score exists, then ("feedback", ...) for each section as it finishes"""
+    sections = queue.Queue()
+    stop = threading.Event()
+    
+    def stream():
+        try:
+            for item in feedback_sections(text):
+                if stop.is_set():
+                    break
+                sections.put(item)
+        finally:
+            sections.put(_END)
+    
+    if feedback_required:
+        _in_background(stream)
+    try:
+        label, confidence, _ = predict_score(text)
+        yield "score", {"score": score_value(label), "confidence": float(confidence)}
+        while feedback_required and (item := sections.get()) is not _END:
+            index, feedback = item
+            yield "feedback", {"index": index, "section": FEEDBACK_SECTIONS[index], "text": feedback}
+    finally:
+        # Stop generating if the consumer goes away, e.g. a client disconnecting mid-stream
+        stop.set()
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def mock_feedback():
+    return [
+        "Unable to analyze grammar. Please set up a valid API token.",
+        "Unable to analyze clarity. Please set up a valid API token.",
+        "Unable to analyze structure. Please set up a valid API token."
+    ]
+
 # HTML for the frontend
 def get_html():
     return """
@@ -204,6 +190,18 @@ def get_html():
         </div>
 
         <script>
+            const categories = ['Grammar and Spelling', 'Clarity and Coherence', 'Structure and Organization'];
+            
+            function showScore(data) {
+                document.getElementById('score').innerHTML = `<p>🎯 Predicted Score: <strong>${data.score}</strong></p>
+                                                             <p>🔍 Confidence: ${(data.confidence * 100).toFixed(2)}%</p>`;
+                document.getElementById('result').style.display = 'block';
+            }
+            
+            function showFeedback(index, text) {
+                document.getElementById(`feedback-${index}`).innerHTML = `<h4>${categories[index] || 'Feedback'}</h4><p>${text}</p>`;
+            }
+            
             async function analyzeEssay() {
                 const essay = document.getElementById('essay').value;
                 if (!essay.trim()) {
@@ -213,26 +211,47 @@ def get_html():
                 
                 document.getElementById('loading').style.display = 'block';
                 document.getElementById('result').style.display = 'none';
+                document.getElementById('feedback').innerHTML = categories.map((category, index) =>
+                    `<div id="feedback-${index}"><h4>${category}</h4><p><em>Generating feedback...</em></p></div>`).join('');
                 
                 try {
-                    const response = await fetch('/api', {
+                    const request = {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
                         body: JSON.stringify({ text: essay })
-                    });
+                    };
                     
-                    const data = await response.json();
-                    document.getElementById('score').innerHTML = `<p>🎯 Predicted Score: <strong>${data.score}</strong></p>
-                                                                 <p>🔍 Confidence: ${(data.confidence * 100).toFixed(2)}%</p>`;
-                    
-                    let feedbackHtml = '';
-                    data.feedback.forEach((item, index) => {
-                        const categories = ['Grammar and Spelling', 'Clarity and Coherence', 'Structure and Organization'];
-                        feedbackHtml += `<h4>${categories[index] || 'Feedback'}</h4><p>${item}</p>`;
-                    });
+                    // Stream the score and each feedback section as they arrive
+                    const response = await fetch('/api/stream', request);
+                    if (response.ok && response.body) {
+                        const reader = response.body.getReader();
+                        const decoder = new TextDecoder();
+                        let buffer = '';
+                        while (true) {
+                            const { value, done } = await reader.read();
+                            if (done) break;
+                            buffer += decoder.decode(value, { stream: true });
+                            let end;
+                            while ((end = buffer.indexOf('\\n\\n')) >= 0) {
+                                const lines = buffer.slice(0, end).split('\\n');
+                                buffer = buffer.slice(end + 2);
+                                const event = (lines.find(line => line.startsWith('event: ')) || '').slice(7);
+                                const data = JSON.parse((lines.find(line => line.startsWith('data: ')) || 'data: {}').slice(6));
+                                if (event === 'score') {
+                                    showScore(data);
+                                    document.getElementById('loading').style.display = 'none';
+                                } else if (event === 'feedback') {
+                                    showFeedback(data.index, data.text);
+                                }
+                            }
+                        }
+                        return;
+                    }
                     
-                    document.getElementById('feedback').innerHTML = feedbackHtml;
-                    document.getElementById('result').style.display = 'block';
+                    // Fall back to the single JSON response
+                    const data = await (await fetch('/api', request)).json();
+                    showScore(data);
+                    data.feedback.forEach((item, index) => showFeedback(index, item));
                 } catch (error) {
                     alert('Error analyzing essay: ' + error.message);
                 } finally {
@@ -259,12 +278,16 @@ class handler(BaseHTTPRequestHandler):
         
         # Process the essay
         text = data.get('text', '')
-        label, confidence, _ = predict_score(text)
-        feedbacks = generate_feedback(text)
+        if self.path.rstrip('/').endswith('/stream'):
+            self.stream_events(text, data.get('feedback_required', True))
+            return
+        
+        with metrics.request_timings() as timings:
+            (label, confidence, _), feedbacks = analyze(text)
         
         # Prepare response
         response = {
-            'score': label,
+            'score': score_value(label),
             'confidence': float(confidence),
             'feedback': feedbacks
         }
@@ -272,33 +295,99 @@ class handler(BaseHTTPRequestHandler):
         # Send response
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        if metrics.TIMING_HEADER:
+            self.send_header('Server-Timing', metrics.server_timing(timings))
         self.end_headers()
         self.wfile.write(json.dumps(response).encode())
+    
+    def stream_events(self, text, feedback_required):
+        # Server-Sent Events: each event is written and flushed as soon as it is ready
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        for event, data in analyze_events(text, feedback_required):
+            self.wfile.write(sse_event(event, data).encode())
+            self.wfile.flush()
+        self.wfile.write(sse_event("done", {}).encode())
+        self.wfile.flush()
 
-# For local testing
-if __name__ == "__main__":
-    import uvicorn
-    from fastapi import FastAPI
+# FastAPI app for local testing - only imported here so the Vercel handler never pays for it
+def create_api():
+    from fastapi import FastAPI, Response
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+    from pydantic import BaseModel
+    
+    # Request/Response models
+    class EssayRequest(BaseModel):
+        text: str
+        feedback_required: Optional[bool] = True
+    
+    class EssayResponse(BaseModel):
+        score: int
+        confidence: float
+        feedback: Optional[List[str]] = None
     
     app = FastAPI(title="Essay Scoring API")
     
+    # Cache, engine and Inference API client counters, read when /metrics is scraped
+    metrics.StatsCounter("essay_result_cache_total", "Score and feedback cache events", lambda: result_cache.stats)
+    metrics.StatsCounter("essay_hf_client_total", "Inference API requests, retries, loading responses and errors",
+                         lambda: engine.backends[0].client.stats)
+    metrics.StatsCounter("essay_engine_total", "Engine requests, failovers and requests no backend could serve",
+                         lambda: engine.stats)
+    metrics.Gauge("essay_backend_latency_seconds", "Smoothed per-essay scoring latency of each backend",
+                  engine.latencies, label="backend")
+    metrics.Gauge("essay_backend_circuit_open", "1 while a backend is out of rotation for scoring", engine.open_circuits,
+                  label="backend")
+    
+    def timed_analyze(text, feedback_required):
+        with metrics.request_timings() as timings:
+            return analyze(text, feedback_required), timings
+    
     @app.get("/", response_class=HTMLResponse)
-    async def read_root(request: Request):
+    async def read_root():
         return HTMLResponse(content=get_html())
     
     @app.post("/api", response_model=EssayResponse)
-    async def predict_api(request: EssayRequest):
-        # Get score
-        label, confidence, _ = predict_score(request.text)
-        
-        # Get feedback if requested
-        feedbacks = generate_feedback(request.text) if request.feedback_required else None
+    async def predict_api(request: EssayRequest, http_response: Response):
+        # Get score, and feedback if requested, concurrently
+        ((label, confidence, _), feedbacks), timings = await run_in_threadpool(
+            timed_analyze, request.text, request.feedback_required
+        )
         
+        if metrics.TIMING_HEADER:
+            http_response.headers["Server-Timing"] = metrics.server_timing(timings)
         return EssayResponse(
-            score=label,
+            score=score_value(label),
             confidence=float(confidence),
             feedback=feedbacks
         )
     
+    @app.post("/api/stream")
+    async def stream_api(request: EssayRequest):
+        # The score event arrives first, then one event per feedback section as it is generated
+        def events():
+            for event, data in analyze_events(request.text, request.feedback_required):
+                yield sse_event(event, data)
+            yield sse_event("done", {})
+        
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    
+    @app.get("/stats")
+    async def read_stats():
+        return {"cache": result_cache.summary(), "engine": engine.summary(), "hf_client": engine.backends[0].client.stats}
+    
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+    
+    return app
+
+# For local testing
+if __name__ == "__main__":
+    import uvicorn
+    
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
+    uvicorn.run(create_api(), host="0.0.0.0", port=port)
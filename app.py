@@ -1,40 +1,107 @@
 import streamlit as st
-from transformers import BertTokenizer, BertForSequenceClassification, pipeline
 import torch
-import torch.nn.functional as F
 import os
-import requests
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 import numpy as np
+from scoring import MODEL_PATH, MAX_LEN, predict_batch, predict_long
+from functools import partial
+from inference import backend_device, load_backend, model_bytes
+from batching import MicroBatcher, QueueFullError
+from bucketing import PaddingStats
+from cache import ResultCache, cache_key
+from feedback_jobs import FeedbackJobs
+from jobs import JOB_MAX_ESSAYS, JobStore, JobWorkers
+from startup import ModelPreloader
+from memshare import memory_report
+from registry import MODEL_DTYPE, ModelRegistry, reduced_precision, tensor_bytes
+from autotune import apply_threads, load_tuning
+from compiled import COMPILE_MODE, CompiledClassifier, compile_classifier
+from tokenization import TokenizationStage
+import metrics
+from engine import FEEDBACK_SECTIONS, LOCAL_BACKENDS, REMOTE_BACKEND, SCORE_CLASSES, Engine, EngineError, score_value
+from engine.local import LocalBackend
+from cascade import CascadeStats, load_first_stage, predict_cascade
+from similarity import EMBEDDING_MODEL, SIMILARITY_INDEX_DIR, SimilarityIndex, embed, load_encoder
 
 # Constants
-MODEL_PATH = "bert_multiclass_model"
 MODEL_FILE = "model.safetensors"
 # Default to GitHub Release URL - change if using a different storage option
 MODEL_URL = "https://github.com/jck-18/Automated-Essay-Scoring/releases/download/v1.0/model.safetensors" 
-MAX_LEN = 256
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Inference backend for the BERT scorer: torch, int8, onnx or onnx-int8
+SCORER_BACKEND = os.environ.get("SCORER_BACKEND", "torch")
+# Backends the scoring engine routes between, first one preferred: any of the above and "remote" (HF Inference API)
+ENGINE_BACKENDS = [name.strip() for name in os.environ.get("ENGINE_BACKENDS", SCORER_BACKEND).split(",") if name.strip()]
+LOCAL_ENGINE_BACKENDS = [name for name in ENGINE_BACKENDS if name in LOCAL_BACKENDS]
+HF_API_TOKEN = os.environ.get("HF_API_TOKEN", "")
+# Memory-map the FP32 weights so every process on the host shares one copy
+MMAP_WEIGHTS = os.environ.get("MMAP_WEIGHTS", "True").lower() == "true"
+# Keep the preferred local scorer loaded: only BART and the fallback scorers are evicted when idle or over budget
+PIN_PREFERRED_SCORER = os.environ.get("PIN_PREFERRED_SCORER", "True").lower() == "true"
+
+# Thread and batch settings measured by `python autotune.py`, if it has been run on this machine
+TUNING = load_tuning()
+
+# Micro-batching settings for the /predict endpoint
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", TUNING["batch_size"] if TUNING else 16))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", 5))
+PREDICT_MAX_QUEUE = int(os.environ.get("PREDICT_MAX_QUEUE", 256))
+
+# Load models in the background as soon as the API starts, instead of on the first request
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "True").lower() == "true"
+
+# Long-document mode scores the whole essay in overlapping windows instead of truncating at MAX_LEN
+LONG_DOC_MODE = os.environ.get("LONG_DOC_MODE", "False").lower() == "true"
+WINDOW_SIZE = int(os.environ.get("WINDOW_SIZE", 512))
+WINDOW_OVERLAP = int(os.environ.get("WINDOW_OVERLAP", 64))
+WINDOW_STRATEGY = os.environ.get("WINDOW_STRATEGY", "mean")
+# Windows scored per essay; text beyond them is ignored
+MAX_WINDOWS = int(os.environ.get("MAX_WINDOWS", 16))
+# Longer API submissions are rejected before they are tokenized
+MAX_ESSAY_CHARS = int(os.environ.get("MAX_ESSAY_CHARS", 100000))
+
+# Confidence cascade: a linear first stage answers confident essays, the rest go through BERT
+CASCADE_MODE = os.environ.get("CASCADE_MODE", "False").lower() == "true"
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", 0.9))
+
+# Near-duplicate detection: "reuse" serves a stored essay's results, "flag" only marks the match, "off" disables it
+SIMILARITY_MODE = os.environ.get("SIMILARITY_MODE", "off")
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", 0.97))
+
+# Result cache versions - bump PROMPT_VERSION whenever the feedback prompts change
+MODEL_VERSION = os.environ.get("MODEL_VERSION", "v1.0")
+PROMPT_VERSION = "1"
+FEEDBACK_MODEL = "facebook/bart-large-cnn"
+# Reduced-precision weights give slightly different results, so they are cached separately
+PRECISION_SUFFIX = ":bf16" if MODEL_DTYPE == "bfloat16" else ""
+SCORE_CACHE_VERSION = f"{MODEL_VERSION}:{ENGINE_BACKENDS[0]}:" + (
+    f"window-{WINDOW_SIZE}-{WINDOW_OVERLAP}-{WINDOW_STRATEGY}-{MAX_WINDOWS}" if LONG_DOC_MODE
+    else f"truncate-{MAX_LEN}"
+) + (f":cascade-{CASCADE_THRESHOLD}" if CASCADE_MODE and not LONG_DOC_MODE else "") + PRECISION_SUFFIX
 
 # Download model if not exists
 def download_model_if_needed():
+    from artifacts import fetch_artifact, load_manifest
+    
     model_file_path = Path(MODEL_PATH) / MODEL_FILE
     
     # Create directory if it doesn't exist
     os.makedirs(MODEL_PATH, exist_ok=True)
     
-    # Check if model file exists
-    if not model_file_path.exists():
+    # The manifest pins the published checksum and size; MODEL_SHA256 overrides it
+    entry = load_manifest(MODEL_PATH).get(MODEL_FILE, {})
+    url = entry.get("url", MODEL_URL)
+    sha256 = os.environ.get("MODEL_SHA256") or entry.get("sha256")
+    size = entry.get("size")
+    
+    # Check if model file exists and is complete
+    if not model_file_path.exists() or (size is not None and model_file_path.stat().st_size != size):
         st.info("Downloading model file (this may take a few minutes)...")
+        progress_bar = st.progress(0.0)
         try:
-            # Download the file
-            response = requests.get(MODEL_URL, stream=True)
-            response.raise_for_status()
-            
-            # Write to file
-            with open(model_file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            # Download in parallel ranges, resuming any partial download, then verify and move into place
+            fetch_artifact(url, model_file_path, sha256=sha256, size=size,
+                           progress=lambda done, total: progress_bar.progress(done / total))
             
             st.success("Model downloaded successfully!")
         except Exception as e:
@@ -43,32 +110,63 @@ def download_model_if_needed():
             st.stop()
 
 # Load model and tokenizer
-@st.cache_resource
-def load_model():
+def load_model(backend=SCORER_BACKEND):
     # Ensure model is downloaded
     download_model_if_needed()
     
-    tokenizer = BertTokenizer.from_pretrained(MODEL_PATH)
-    model = BertForSequenceClassification.from_pretrained(MODEL_PATH)
-    model.to(DEVICE)
-    model.eval()
-    return tokenizer, model
+    tokenizer, model = load_backend(backend, MODEL_PATH, backend_device(backend), mmap=MMAP_WEIGHTS)
+    if backend == "torch":
+        model = reduced_precision(model)
+    # Specialized graphs are built and warmed up here, so the first request doesn't pay for them
+    model = compile_classifier(
+        model, COMPILE_MODE, max_length=WINDOW_SIZE if LONG_DOC_MODE else MAX_LEN, pad_token_id=tokenizer.pad_token_id
+    )
+    return TokenizationStage(tokenizer), model
 
-# Load LLM for feedback (cached for efficiency)
-@st.cache_resource
+# Load LLM for feedback
 def load_llm():
     # Use a lightweight model from Hugging Face for feedback
+    from transformers import pipeline
     try:
         feedback_generator = pipeline(
             "text2text-generation",
-            model="facebook/bart-large-cnn",
+            model=FEEDBACK_MODEL,
             device=0 if torch.cuda.is_available() else -1,
+            torch_dtype=torch.bfloat16 if MODEL_DTYPE == "bfloat16" and not torch.cuda.is_available() else None,
         )
         return feedback_generator
     except Exception as e:
         st.warning(f"Could not load feedback model: {str(e)}. Will continue without feedback feature.")
         return None
 
+# Score and feedback cache (kept across Streamlit reruns and shared by the API)
+@st.cache_resource
+def load_result_cache():
+    return ResultCache()
+
+# BERT and BART load on first use and, unless pinned, are evicted when idle or over MODEL_MEMORY_BUDGET_MB
+@st.cache_resource
+def load_model_registry():
+    registry = ModelRegistry()
+    for backend in LOCAL_ENGINE_BACKENDS:
+        registry.register(f"scorer:{backend}", partial(load_model, backend), size_fn=lambda scorer: model_bytes(scorer[1]),
+                          pinned=PIN_PREFERRED_SCORER and backend == LOCAL_ENGINE_BACKENDS[0])
+    registry.register("feedback", load_llm, size_fn=lambda generator: tensor_bytes(generator.model))
+    return registry
+
+# Cascade first stage and near-duplicate index, kept across Streamlit reruns like the models above
+@st.cache_resource
+def load_cascade():
+    first_stage = load_first_stage()
+    if first_stage is None:
+        print("WARNING: CASCADE_MODE is set but no first-stage model was found; run `python cascade.py train`")
+    return first_stage
+
+@st.cache_resource
+def load_similarity():
+    encoder = load_encoder()
+    return encoder, SimilarityIndex(encoder.get_sentence_embedding_dimension(), SIMILARITY_INDEX_DIR)
+
 # Title
 st.title("📝 Essay Score Evaluator")
 st.write("Enter your essay below to get the predicted score and feedback based on our models.")
@@ -79,32 +177,148 @@ essay = st.text_area("✍️ Your Essay", height=300)
 # Tabs for different features
 tab1, tab2 = st.tabs(["Score Prediction", "Essay Feedback"])
 
-# Load models
-try:
-    tokenizer, model = load_model()
-    feedback_model = load_llm()
-except Exception as e:
-    st.error(f"Error loading models: {str(e)}")
-    st.error("Please make sure the model files are correctly placed in the appropriate directory.")
-    st.stop()
+# The preferred local scorer is loaded by load_models(): up front for the Streamlit UI, in the background
+# for the API. Other models are loaded by the registry the first time the engine routes work to them.
+first_stage = similarity_encoder = similarity_index = None
+models_loaded = False
+result_cache = load_result_cache()
+model_registry = load_model_registry()
+
+def load_models():
+    global first_stage, similarity_encoder, similarity_index, models_loaded
+    model_registry.start_reaper()
+    if models_loaded:
+        return
+    apply_threads(TUNING)
+    if LOCAL_ENGINE_BACKENDS:
+        model_registry.get(f"scorer:{LOCAL_ENGINE_BACKENDS[0]}")
+    if CASCADE_MODE and not LONG_DOC_MODE:
+        first_stage = load_cascade()
+    if SIMILARITY_MODE != "off":
+        similarity_encoder, similarity_index = load_similarity()
+    models_loaded = True
+
+def scorer_tokenizer():
+    """The preferred local scorer's tokenizer if it is loaded, for cache statistics"""
+    scorer = model_registry.peek(f"scorer:{LOCAL_ENGINE_BACKENDS[0]}") if LOCAL_ENGINE_BACKENDS else None
+    return scorer[0] if scorer is not None else None
+
+def compiled_summary():
+    """Warm-up timings and dispatch counts of the preferred local scorer, if it runs compiled"""
+    scorer = model_registry.peek(f"scorer:{LOCAL_ENGINE_BACKENDS[0]}") if LOCAL_ENGINE_BACKENDS else None
+    return scorer[1].summary() if scorer is not None and isinstance(scorer[1], CompiledClassifier) else None
+
+if st.runtime.exists():
+    try:
+        load_models()
+    except Exception as e:
+        st.error(f"Error loading models: {str(e)}")
+        st.error("Please make sure the model files are correctly placed in the appropriate directory.")
+        st.stop()
+
+# Padding achieved by length-bucketed batching, reported on /stats
+padding_stats = PaddingStats()
+# Escalation rate and audited agreement of the cascade, reported on /stats
+cascade_stats = CascadeStats(CASCADE_THRESHOLD)
+
+# Predict functions
+def _predict_local(texts, tokenizer, model, device):
+    if first_stage is not None:
+        return predict_cascade(
+            texts, tokenizer, model, first_stage, device=device, max_length=MAX_LEN, threshold=CASCADE_THRESHOLD,
+            batch_size=PREDICT_MAX_BATCH_SIZE, stats=padding_stats, cascade_stats=cascade_stats,
+        )
+    if LONG_DOC_MODE:
+        return predict_long(
+            texts, tokenizer, model, device=device, window_size=WINDOW_SIZE, overlap=WINDOW_OVERLAP,
+            strategy=WINDOW_STRATEGY, batch_size=PREDICT_MAX_BATCH_SIZE, stats=padding_stats, max_windows=MAX_WINDOWS,
+        )
+    return predict_batch(
+        texts, tokenizer, model, device=device, max_length=MAX_LEN,
+        batch_size=PREDICT_MAX_BATCH_SIZE, stats=padding_stats,
+    )
+
+def near_duplicate_key(text):
+    return cache_key(text, "near-duplicate", EMBEDDING_MODEL)
+
+def _match_near_duplicates(texts, keys, results, missing):
+    """Fill in results of essays close to one scored before; return [(index, embedding or None)] still to score"""
+    with metrics.stage("embed"):
+        vectors = embed(similarity_encoder, [texts[i] for i in missing])
+    
+    remaining = []
+    for i, vector in zip(missing, vectors):
+        match = similarity_index.search(vector, SIMILARITY_THRESHOLD)
+        if match is None:
+            remaining.append((i, vector))
+            continue
+        
+        (score_key, feedback_key), similarity = match[0].split(" "), match[1]
+        result_cache.set(near_duplicate_key(texts[i]), round(similarity, 4))
+        if SIMILARITY_MODE != "reuse":
+            # Scored normally, but not indexed: the essay it resembles already represents it
+            remaining.append((i, None))
+            continue
+        cached = result_cache.get(score_key)
+        if cached is None:
+            # The stored essay's results have left the cache: this essay is scored and takes its place
+            similarity_index.retire(match[0])
+            remaining.append((i, vector))
+            continue
+        results[i] = cached
+        result_cache.set(keys[i], cached)
+        feedback = result_cache.get(feedback_key)
+        if feedback is not None:
+            result_cache.set(feedback_cache_key(texts[i]), feedback)
+    return remaining
+
+def predict_scores(texts):
+    keys = [cache_key(text, "score", SCORE_CACHE_VERSION) for text in texts]
+    results = [result_cache.get(key) for key in keys]
+    
+    # Only essays that missed the cache (and, if enabled, the near-duplicate index) go through the model
+    missing = [(i, None) for i, result in enumerate(results) if result is None]
+    if missing and similarity_index is not None:
+        missing = _match_near_duplicates(texts, keys, results, [i for i, _ in missing])
+    if missing:
+        backend, scored = engine.score([texts[i] for i, _ in missing])
+        for (i, vector), (label, confidence, probs) in zip(missing, scored):
+            results[i] = [label, confidence, np.asarray(probs).tolist()]
+            # Results of a fallback backend are served but not cached, so the preferred one re-scores the essay later
+            if backend != engine.primary:
+                continue
+            result_cache.set(keys[i], results[i])
+            if vector is not None:
+                similarity_index.add(vector, f"{keys[i]} {feedback_cache_key(texts[i])}")
+        if similarity_index is not None:
+            similarity_index.flush()
+    
+    return [(label, confidence, np.asarray(probs)) for label, confidence, probs in results]
 
-# Predict function
 def predict_score(text):
-    tokens = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=MAX_LEN)
-    tokens = {k: v.to(DEVICE) for k, v in tokens.items()}
-    with torch.no_grad():
-        output = model(**tokens)
-    logits = output.logits
-    probabilities = F.softmax(logits, dim=1).squeeze()
-    predicted_label = torch.argmax(probabilities).item()
-    confidence = probabilities[predicted_label].item()
-    return predicted_label, confidence, probabilities.cpu().numpy()
+    return predict_scores([text])[0]
 
 # Feedback function using the LLM
+def feedback_cache_key(text):
+    return cache_key(text, "feedback", FEEDBACK_MODEL, PROMPT_VERSION + PRECISION_SUFFIX)
+
 def generate_feedback(text):
-    if feedback_model is None:
-        return "Feedback model not available. Please try again later."
+    # Checked before the engine is asked, so cached feedback never loads the feedback model
+    key = feedback_cache_key(text)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
     
+    try:
+        backend, feedbacks, complete = engine.feedback(text)
+    except EngineError as e:
+        print(f"Error in feedback generation: {str(e)}")
+        return ["Feedback model not available. Please try again later."] * len(FEEDBACK_SECTIONS)
+    if complete and backend == engine.primary:
+        result_cache.set(key, feedbacks)
+    return feedbacks
+
+def _generate_local(feedback_model, text):
     # Create prompts for different aspects of feedback
     prompts = [
         f"Identify grammar and spelling errors in this essay: {text[:500]}...",
@@ -112,60 +326,84 @@ def generate_feedback(text):
         f"Evaluate the structure and organization of this essay: {text[:500]}..."
     ]
     
-    feedbacks = []
-    for prompt in prompts:
-        try:
-            result = feedback_model(prompt, max_length=150, min_length=30, do_sample=False)
-            feedbacks.append(result[0]['generated_text'])
-        except Exception as e:
-            feedbacks.append(f"Could not generate this feedback: {str(e)}")
-    
-    return feedbacks
+    # All three prompts go through the model as one batched generation call
+    with metrics.stage("generate"):
+        results = feedback_model(prompts, max_length=150, min_length=30, do_sample=False, batch_size=len(prompts))
+    return [(result[0] if isinstance(result, list) else result)['generated_text'] for result in results]
+
+# One engine for the UI and the API: local backends share the model registry, "remote" calls the Inference API
+@st.cache_resource
+def load_engine():
+    backends = []
+    for name in ENGINE_BACKENDS:
+        if name == REMOTE_BACKEND:
+            from engine.remote import RemoteBackend
+            backends.append(RemoteBackend(HF_API_TOKEN))
+        elif name in LOCAL_BACKENDS:
+            backends.append(LocalBackend(
+                name, model_registry, f"scorer:{name}", backend_device(name), _predict_local, _generate_local
+            ))
+        else:
+            raise ValueError(f"Unknown engine backend '{name}', expected {REMOTE_BACKEND} or one of {LOCAL_BACKENDS}")
+    return Engine(backends)
+
+engine = load_engine()
 
 # Button to analyze
 if st.button("Analyze Essay"):
     if essay.strip() == "":
         st.warning("Please enter an essay to evaluate.")
     else:
-        with st.spinner("Analyzing your essay..."):
-            # Get score prediction
-            label, confidence, probs = predict_score(essay)
-            
-            # Get feedback
-            feedbacks = generate_feedback(essay)
+        try:
+            with st.spinner("Scoring your essay..."):
+                # Get score prediction
+                label, confidence, probs = predict_score(essay)
+        except EngineError as e:
+            print(f"Error in scoring: {str(e)}")
+            label = None
         
-        # Display in tabs
-        with tab1:
-            st.success(f"🎯 Predicted Score: {label}")
-            st.write(f"🔍 Confidence: {confidence * 100:.2f}%")
-
-            # Show probabilities chart
-            st.subheader("🔢 Probability Distribution")
-            import matplotlib.pyplot as plt
-
-            fig, ax = plt.subplots(figsize=(10, 4))
-            ax.bar(np.arange(len(probs)), probs, color="skyblue")
-            ax.set_xlabel("Score Label")
-            ax.set_ylabel("Probability")
-            ax.set_title("Model Confidence Distribution")
-            st.pyplot(fig)
+        if label is None:
+            st.error("The scoring service is unavailable right now. Please try again in a moment.")
+        else:
+            # Display the score first; feedback fills in once it has been generated
+            with tab1:
+                st.success(f"🎯 Predicted Score: {score_value(label)}")
+                st.write(f"🔍 Confidence: {confidence * 100:.2f}%")
+                similarity = result_cache.get(near_duplicate_key(essay)) if similarity_index is not None else None
+                if similarity is not None:
+                    st.info(f"This essay is {similarity * 100:.1f}% similar to one scored before.")
+
+                # Show probabilities chart
+                st.subheader("🔢 Probability Distribution")
+                import matplotlib.pyplot as plt
+
+                fig, ax = plt.subplots(figsize=(10, 4))
+                ax.bar(np.arange(len(probs)), probs, color="skyblue")
+                ax.set_xticks(np.arange(len(probs))[::4], [str(score) for score in SCORE_CLASSES[::4]])
+                ax.set_xlabel("Score")
+                ax.set_ylabel("Probability")
+                ax.set_title("Model Confidence Distribution")
+                st.pyplot(fig)
         
-        with tab2:
-            st.subheader("📝 Essay Feedback")
+            with tab2:
+                st.subheader("📝 Essay Feedback")
             
-            # Grammar and spelling
-            with st.expander("Grammar and Spelling", expanded=True):
-                st.write(feedbacks[0])
+                with st.spinner("Generating feedback..."):
+                    feedbacks = generate_feedback(essay)
             
-            # Clarity and coherence
-            with st.expander("Clarity and Coherence", expanded=True):
-                st.write(feedbacks[1])
+                # Grammar and spelling
+                with st.expander("Grammar and Spelling", expanded=True):
+                    st.write(feedbacks[0])
             
-            # Structure and organization
-            with st.expander("Structure and Organization", expanded=True):
-                st.write(feedbacks[2])
+                # Clarity and coherence
+                with st.expander("Clarity and Coherence", expanded=True):
+                    st.write(feedbacks[1])
             
-            st.info("Note: This feedback is generated by an AI model and should be used as a general guide only.")
+                # Structure and organization
+                with st.expander("Structure and Organization", expanded=True):
+                    st.write(feedbacks[2])
+            
+                st.info("Note: This feedback is generated by an AI model and should be used as a general guide only.")
 
 # Add info about the FastAPI deployment
 st.sidebar.title("About")
@@ -175,40 +413,223 @@ st.sidebar.info(
 )
 
 # FastAPI integration for cloud deployment
-if __name__ == "__main__" and os.environ.get("ENABLE_API", "False").lower() == "true":
-    import uvicorn
-    from fastapi import FastAPI, Body
+def create_api():
+    from fastapi import FastAPI, HTTPException, Response
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import JSONResponse, PlainTextResponse
     from pydantic import BaseModel
+    from typing import List, Optional
     
     class EssayRequest(BaseModel):
         text: str
+        wait_for_feedback: Optional[bool] = False
     
     class EssayResponse(BaseModel):
         score: int
         confidence: float
-        feedback: list
+        feedback: Optional[list] = None
+        feedback_job: Optional[str] = None
+        feedback_status: str
+        near_duplicate: Optional[float] = None
+    
+    class FeedbackResponse(BaseModel):
+        status: str
+        feedback: Optional[list] = None
+        error: Optional[str] = None
+    
+    class JobEssay(BaseModel):
+        text: str
+        id: Optional[str] = None
+    
+    class JobRequest(BaseModel):
+        essays: List[JobEssay]
+        feedback: Optional[bool] = False
     
     app = FastAPI(title="Essay Scoring API")
     
+    # Concurrent /predict calls are coalesced into one padded forward pass
+    batcher = MicroBatcher(
+        predict_scores,
+        max_batch_size=PREDICT_MAX_BATCH_SIZE,
+        max_wait_ms=PREDICT_MAX_WAIT_MS,
+        max_queue=PREDICT_MAX_QUEUE,
+    )
+    
+    # Feedback is generated in the background and fetched from /feedback/{job_id}
+    feedback_jobs = FeedbackJobs(generate_feedback)
+    
+    # Models load on a background thread; /ready reports when requests can be served
+    preloader = ModelPreloader(load_models)
+    
+    # Large submissions are stored in SQLite and drained in the background, surviving restarts
+    job_store = JobStore()
+    # Job chunks run on the micro-batcher's thread, so they never race /predict batches for the model
+    job_workers = JobWorkers(
+        job_store,
+        lambda texts: [(score_value(label), confidence, probs) for label, confidence, probs in batcher.run_batch(texts)],
+        generate_feedback, ready_fn=partial(preloader.wait, retry=True), retry_errors=(EngineError,),
+    )
+    
+    # Scheduler and cache state, read when /metrics is scraped
+    metrics.Gauge("essay_queue_depth", "Requests waiting for the micro-batcher", lambda: batcher.queue_depth)
+    metrics.Gauge("essay_batch_size", "Essays in the most recent forward batch", lambda: batcher.stats["last_batch_size"])
+    metrics.Gauge("essay_max_batch_size", "Largest forward batch since startup", lambda: batcher.stats["max_batch_seen"])
+    metrics.Gauge("essay_feedback_pending", "Feedback jobs queued or running", lambda: feedback_jobs.pending)
+    metrics.Gauge("essay_cascade_escalation_rate", "Fraction of essays the cascade sent on to BERT",
+                  lambda: cascade_stats.summary()["escalation_rate"] or 0)
+    metrics.Gauge("essay_job_items_pending", "Job essays waiting for a score or feedback", job_store.pending)
+    metrics.StatsCounter("essay_batcher_total", "Micro-batcher requests, batches and rejections", lambda: batcher.stats,
+                         gauges=("max_batch_seen", "last_batch_size"))
+    metrics.StatsCounter("essay_result_cache_total", "Score and feedback cache events", lambda: result_cache.stats)
+    metrics.StatsCounter(
+        "essay_token_cache_total", "Token id cache events",
+        lambda: scorer_tokenizer().stats if scorer_tokenizer() is not None else None,
+    )
+    metrics.Gauge("essay_model_resident_bytes", "Resident weight bytes of each loaded model",
+                  model_registry.resident_bytes, label="model")
+    metrics.StatsCounter("essay_model_registry_total", "Model loads, evictions and hits", lambda: model_registry.stats)
+    remote_backend = next((backend for backend in engine.backends if backend.name == REMOTE_BACKEND), None)
+    if remote_backend is not None:
+        metrics.StatsCounter("essay_hf_client_total", "Inference API requests, retries, loading responses and errors",
+                             lambda: remote_backend.client.stats)
+    metrics.StatsCounter("essay_engine_total", "Engine requests, failovers and requests no backend could serve",
+                         lambda: engine.stats)
+    metrics.Gauge("essay_backend_latency_seconds", "Smoothed per-essay scoring latency of each backend",
+                  engine.latencies, label="backend")
+    metrics.Gauge("essay_backend_circuit_open", "1 while a backend is out of rotation for scoring", engine.open_circuits,
+                  label="backend")
+    
+    @app.on_event("startup")
+    async def start_preloading():
+        if PRELOAD_MODELS:
+            preloader.start()
+        model_registry.start_reaper()
+        job_workers.start()
+    
+    async def ensure_models():
+        if not preloader.ready:
+            try:
+                await run_in_threadpool(preloader.wait)
+            except RuntimeError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+    
+    @app.on_event("shutdown")
+    async def stop_workers():
+        await batcher.stop()
+        feedback_jobs.shutdown()
+        job_workers.stop()
+        model_registry.stop()
+    
     @app.post("/predict", response_model=EssayResponse)
-    async def predict_api(request: EssayRequest):
-        # Get score
-        label, confidence, _ = predict_score(request.text)
+    async def predict_api(request: EssayRequest, http_response: Response):
+        if len(request.text) > MAX_ESSAY_CHARS:
+            raise HTTPException(status_code=413, detail=f"An essay can be at most {MAX_ESSAY_CHARS} characters long")
+        await ensure_models()
         
-        # Get feedback
-        feedbacks = generate_feedback(request.text)
+        with metrics.request_timings() as timings:
+            # Get score
+            try:
+                label, confidence, _ = await batcher.submit(request.text)
+            except QueueFullError as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+            except EngineError as e:
+                # Every backend is failing or out of rotation; they are probed again after the cooldown
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(engine.cooldown))})
+            
+            response = EssayResponse(score=score_value(label), confidence=float(confidence), feedback_status="ready")
+            if similarity_index is not None:
+                response.near_duplicate = result_cache.get(near_duplicate_key(request.text))
+            
+            # Return cached feedback inline, otherwise hand it to a background job
+            response.feedback = result_cache.get(feedback_cache_key(request.text))
+            if response.feedback is None:
+                if request.wait_for_feedback:
+                    response.feedback = await run_in_threadpool(generate_feedback, request.text)
+                else:
+                    response.feedback_job = feedback_jobs.submit(request.text)
+                    response.feedback_status = "pending" if response.feedback_job else "busy"
         
-        return EssayResponse(
-            score=label,
-            confidence=float(confidence),
-            feedback=feedbacks
-        )
+        if metrics.TIMING_HEADER:
+            http_response.headers["Server-Timing"] = metrics.server_timing(timings)
+        return response
+    
+    @app.get("/feedback/{job_id}", response_model=FeedbackResponse)
+    def read_feedback(job_id: str):
+        status = feedback_jobs.status(job_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired feedback job")
+        return FeedbackResponse(**status)
+    
+    @app.post("/jobs", status_code=202)
+    def create_job(request: JobRequest):
+        if not request.essays:
+            raise HTTPException(status_code=422, detail="A job needs at least one essay")
+        if len(request.essays) > JOB_MAX_ESSAYS:
+            raise HTTPException(status_code=413, detail=f"A job can hold at most {JOB_MAX_ESSAYS} essays")
+        if any(len(essay.text) > MAX_ESSAY_CHARS for essay in request.essays):
+            raise HTTPException(status_code=413, detail=f"An essay can be at most {MAX_ESSAY_CHARS} characters long")
+        essays = [(essay.id, essay.text) for essay in request.essays]
+        return {"job_id": job_store.create(essays, request.feedback), "total": len(essays)}
+    
+    @app.get("/jobs/{job_id}")
+    def read_job(job_id: str, offset: int = 0, limit: int = 100):
+        status = job_store.status(job_id, max(offset, 0), min(max(limit, 1), 1000))
+        if status is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return status
+    
+    # Liveness and readiness probes
+    @app.get("/healthz")
+    def read_health():
+        return {"status": "ok"}
+    
+    @app.get("/ready")
+    def read_ready():
+        status = preloader.status()
+        return JSONResponse(status, status_code=200 if preloader.ready else 503)
+    
+    # Resident memory of this worker, split into shared and unique pages
+    @app.get("/memory")
+    def read_memory():
+        return memory_report()
+    
+    # Prometheus scrape endpoint
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def read_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
     
     # Documentation endpoint
     @app.get("/")
     def read_root():
         return {"message": "Welcome to the Essay Scoring API. Go to /docs for documentation."}
     
+    # Scheduler statistics
+    @app.get("/stats")
+    def read_stats():
+        return {
+            "queue_depth": batcher.queue_depth,
+            **batcher.stats,
+            "feedback_pending": feedback_jobs.pending,
+            "padding": padding_stats.summary(),
+            "cache": result_cache.summary(),
+            "tokenizer_cache": scorer_tokenizer().stats if scorer_tokenizer() is not None else None,
+            "models": model_registry.summary(),
+            "engine": engine.summary(),
+            "compiled": compiled_summary(),
+            "cascade": cascade_stats.summary() if first_stage is not None else None,
+            "similarity": similarity_index.summary() if similarity_index is not None else None,
+        }
+    
+    return app
+
+def serve_api(port=8000, sock=None):
+    import uvicorn
+    if sock is None:
+        uvicorn.run(create_api(), host="0.0.0.0", port=port)
+    else:
+        # Worker process serving on a socket bound by the parent
+        uvicorn.Server(uvicorn.Config(create_api(), host="0.0.0.0", port=port)).run(sockets=[sock])
+
+if __name__ == "__main__" and os.environ.get("ENABLE_API", "False").lower() == "true":
     # Start the server
-    port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    serve_api(int(os.environ.get("PORT", 8000)))
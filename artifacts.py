@@ -0,0 +1,267 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+# Shared, content-addressed store; several containers on one host can mount the same directory
+ARTIFACT_CACHE_DIR = os.environ.get("ARTIFACT_CACHE_DIR", os.path.expanduser("~/.cache/essay-scoring/artifacts"))
+MANIFEST_FILE = "manifest.json"
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 4))
+CHUNK_SIZE = 8 * 1024 * 1024
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+CHUNK_RETRIES = 3
+
+
+class ArtifactError(Exception):
+    """Raised when an artifact cannot be downloaded or fails verification"""
+
+
+def sha256_file(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(model_path):
+    """Read {file name: {"url", "sha256", "size"}} from the model directory's manifest, if any"""
+    path = Path(model_path) / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(model_path, file_name, url):
+    """Record the URL, digest and size of a known-good local file in the manifest"""
+    manifest = load_manifest(model_path)
+    file_path = Path(model_path) / file_name
+    manifest[file_name] = {"url": url, "sha256": sha256_file(file_path), "size": file_path.stat().st_size}
+    with open(Path(model_path) / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest[file_name]
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive flock on path (created if needed) for the duration of the block"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _place(source, dest):
+    """Hard-link (or copy) a cached blob into place, then atomically rename it to dest"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, dest)
+    return dest
+
+
+class _RangeDownload:
+    """Downloads a file as parallel byte ranges into a sparse .part file, remembering finished chunks"""
+
+    def __init__(self, session, url, part_path, size, chunk_size, progress=None):
+        self.session = session
+        self.url = url
+        self.part_path = part_path
+        self.state_path = part_path.with_suffix(".json")
+        self.size = size
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._lock = threading.Lock()
+        self.done = set()
+        if self.state_path.exists() and part_path.exists():
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get("size") == size and state.get("chunk_size") == chunk_size:
+                self.done = set(state["done"])
+
+    def run(self, workers):
+        chunks = [i for i in range((self.size + self.chunk_size - 1) // self.chunk_size) if i not in self.done]
+        fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT)
+        try:
+            os.ftruncate(fd, self.size)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # Progress is reported from the calling thread so UI callbacks stay on it
+                for future in as_completed([pool.submit(self._fetch_chunk, fd, i) for i in chunks]):
+                    future.result()
+                    if self.progress:
+                        self.progress(min(len(self.done) * self.chunk_size, self.size), self.size)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _fetch_chunk(self, fd, index):
+        for attempt in range(CHUNK_RETRIES):
+            try:
+                return self._fetch_range(fd, index)
+            except (requests.RequestException, ArtifactError):
+                if attempt == CHUNK_RETRIES - 1:
+                    raise
+
+    def _fetch_range(self, fd, index):
+        start = index * self.chunk_size
+        end = min(start + self.chunk_size, self.size) - 1
+        response = self.session.get(
+            self.url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        if response.status_code != 206:
+            raise ArtifactError(f"Range request for bytes {start}-{end} returned HTTP {response.status_code}")
+        offset = start
+        for block in response.iter_content(chunk_size=256 * 1024):
+            os.pwrite(fd, block, offset)
+            offset += len(block)
+        if offset != end + 1:
+            raise ArtifactError(f"Short read for bytes {start}-{end}: got {offset - start} bytes")
+
+        with self._lock:
+            self.done.add(index)
+            tmp_path = self.state_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"size": self.size, "chunk_size": self.chunk_size, "done": sorted(self.done)}, f)
+            os.replace(tmp_path, self.state_path)
+
+
+def _download_stream(session, url, part_path, progress=None):
+    """Fallback for servers without range support: one sequential stream"""
+    with session.get(url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as response:
+        response.raise_for_status()
+        total = int(response.headers.get("Content-Length", 0))
+        written = 0
+        with open(part_path, "wb") as f:
+            for block in response.iter_content(chunk_size=256 * 1024):
+                f.write(block)
+                written += len(block)
+                if progress and total:
+                    progress(written, total)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _is_complete(dest, sha256, size):
+    if not dest.exists():
+        return False
+    if size is not None:
+        # Cheap check first: a truncated file never has the published size
+        return dest.stat().st_size == size
+    return sha256 is None or sha256_file(dest) == sha256
+
+
+def _known_digest(cache_dir, url_key):
+    """Digest of the blob last downloaded from a URL, recorded so callers without a checksum reuse it"""
+    path = cache_dir / "urls" / url_key
+    return path.read_text().strip() if path.exists() else None
+
+
+def _remember_digest(cache_dir, url_key, digest):
+    path = cache_dir / "urls" / url_key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{url_key}.{os.getpid()}.tmp")
+    tmp_path.write_text(digest)
+    os.replace(tmp_path, path)
+
+
+def fetch_artifact(url, dest, sha256=None, size=None, workers=DOWNLOAD_WORKERS, chunk_size=CHUNK_SIZE,
+                   cache_dir=ARTIFACT_CACHE_DIR, progress=None):
+    """Download url to dest via the shared content-addressed cache.
+
+    Interrupted downloads resume from the chunks already on disk, the result is
+    verified against `sha256` when given, and dest only ever appears complete.
+    """
+    dest = Path(dest)
+    if _is_complete(dest, sha256, size):
+        return dest
+
+    cache_dir = Path(cache_dir)
+    blob_dir = cache_dir / "sha256"
+    url_key = hashlib.sha256(url.encode()).hexdigest()
+    key = sha256 or url_key
+
+    # One download per artifact per host; other containers wait and reuse the blob
+    with file_lock(cache_dir / "locks" / f"{key}.lock"):
+        # Without a published checksum, the blob is found through the digest recorded for its URL
+        known = sha256 or _known_digest(cache_dir, url_key)
+        if known and (blob_dir / known).exists() and (size is None or (blob_dir / known).stat().st_size == size):
+            return _place(blob_dir / known, dest)
+
+        part_dir = cache_dir / "partial"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        part_path = part_dir / f"{key}.part"
+
+        with requests.Session() as session:
+            head = session.head(url, allow_redirects=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            head.raise_for_status()
+            remote_size = int(head.headers.get("Content-Length", 0))
+            if head.headers.get("Accept-Ranges") == "bytes" and remote_size:
+                # Range requests go to the final URL so redirects are only followed once
+                _RangeDownload(session, head.url, part_path, remote_size, chunk_size, progress).run(workers)
+            else:
+                _download_stream(session, url, part_path, progress)
+
+        digest = sha256_file(part_path)
+        if sha256 and digest != sha256:
+            part_path.unlink()
+            part_path.with_suffix(".json").unlink(missing_ok=True)
+            raise ArtifactError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+
+        blob_dir.mkdir(parents=True, exist_ok=True)
+        os.replace(part_path, blob_dir / digest)
+        part_path.with_suffix(".json").unlink(missing_ok=True)
+        _remember_digest(cache_dir, url_key, digest)
+        return _place(blob_dir / digest, dest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch model artifacts or record their checksums")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch = subparsers.add_parser("fetch", help="Download a file listed in a model directory's manifest")
+    fetch.add_argument("model_path", help="Model directory containing manifest.json")
+    fetch.add_argument("file_name", nargs="?", default="model.safetensors",
+                       help="File to fetch (default: model.safetensors)")
+    fetch.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                       help=f"Parallel range requests (default: {DOWNLOAD_WORKERS})")
+
+    record = subparsers.add_parser("manifest", help="Add a known-good local file to the manifest")
+    record.add_argument("model_path", help="Model directory")
+    record.add_argument("file_name", help="File inside the model directory")
+    record.add_argument("--url", required=True, help="URL the file is published at")
+
+    args = parser.parse_args()
+    if args.command == "manifest":
+        entry = write_manifest(args.model_path, args.file_name, args.url)
+        print(f"{args.file_name}: sha256 {entry['sha256']}, {entry['size']} bytes")
+    else:
+        entry = load_manifest(args.model_path).get(args.file_name)
+        if entry is None:
+            raise SystemExit(f"{args.file_name} is not listed in {Path(args.model_path) / MANIFEST_FILE}")
+        dest = fetch_artifact(entry["url"], Path(args.model_path) / args.file_name, entry.get("sha256"),
+                              entry.get("size"), workers=args.workers)
+        print(f"Fetched {dest}")
+
+
+if __name__ == "__main__":
+    main()
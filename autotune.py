@@ -0,0 +1,209 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import time
+from multiprocessing import cpu_count, get_context
+
+import numpy as np
+
+# Configuration written by `python autotune.py` and read by the serving modes at startup
+TUNING_FILE = os.environ.get("TUNING_FILE", "tuning.json")
+LATENCY_SLO_MS = 500
+# Length of the synthetic essays used for tuning, close to a typical submission
+TUNE_ESSAY_WORDS = 300
+# A configuration whose workers have not all reported back by then (crashed, OOM, hung) is recorded as failed
+MEASURE_TIMEOUT_SECONDS = 600
+
+
+def load_tuning(path=TUNING_FILE):
+    """Return the tuned configuration, or None if there is none for this machine"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        tuning = json.load(f)
+    if tuning.get("cpu_count") != cpu_count():
+        print(f"WARNING: {path} was tuned for {tuning.get('cpu_count')} CPUs, this machine has {cpu_count()}; ignoring it")
+        return None
+    return tuning
+
+
+def apply_threads(tuning):
+    """Set torch's intra-op and inter-op thread pools from a tuned configuration"""
+    import torch
+
+    if tuning is None:
+        return
+    torch.set_num_threads(tuning["intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(tuning["inter_op_threads"])
+    except RuntimeError:
+        # Only possible before the first inter-op parallel work in this process
+        pass
+
+
+def _worker(intra, inter, batch_size, essays, backend, barrier, results, timeout):
+    # Runs in a fresh process: the inter-op pool can only be sized before torch uses it
+    import torch
+    from bench import synthetic_essays
+    from inference import load_backend
+    from scoring import MODEL_PATH, predict_batch
+
+    torch.set_num_interop_threads(inter)
+    torch.set_num_threads(intra)
+    tokenizer, model = load_backend(backend, MODEL_PATH, torch.device("cpu"), mmap=backend == "torch")
+    texts = synthetic_essays(essays, TUNE_ESSAY_WORDS, seed=os.getpid())
+    predict_batch(texts[:batch_size], tokenizer, model, device=torch.device("cpu"))
+
+    # Raises BrokenBarrierError, ending this worker, if a sibling never gets here
+    barrier.wait(timeout)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        batch_started = time.perf_counter()
+        predict_batch(texts[i:i + batch_size], tokenizer, model, device=torch.device("cpu"), batch_size=batch_size)
+        latencies.append(time.perf_counter() - batch_started)
+    results.put((latencies, len(texts), time.perf_counter() - started))
+
+
+def _collect(workers, results, timeout):
+    """Wait for one result per worker; returns (outcomes, error), giving up when a worker dies or time runs out"""
+    deadline = time.monotonic() + timeout
+    outcomes = []
+    while len(outcomes) < len(workers):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return outcomes, f"timed out after {timeout:.0f}s"
+        try:
+            outcomes.append(results.get(timeout=min(remaining, 1.0)))
+            continue
+        except queue.Empty:
+            pass
+        # A worker that exited without reporting (crash, OOM kill) leaves the rest stuck at the barrier
+        crashed = [worker.exitcode for worker in workers if worker.exitcode not in (None, 0)]
+        if crashed:
+            return outcomes, f"worker exited with code {crashed[0]}"
+    return outcomes, None
+
+
+def measure(processes, intra, inter, batch_size, essays=64, backend="torch", timeout=MEASURE_TIMEOUT_SECONDS):
+    """Throughput and batch latency of `processes` concurrent scorers with the given thread settings"""
+    context = get_context("spawn")
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(intra, inter, batch_size, essays, backend, barrier, results, timeout))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    outcomes, error = _collect(workers, results, timeout)
+    for worker in workers:
+        if error is not None and worker.is_alive():
+            worker.terminate()
+        worker.join()
+
+    config = {
+        "processes": processes,
+        "intra_op_threads": intra,
+        "inter_op_threads": inter,
+        "batch_size": batch_size,
+    }
+    if error is not None:
+        return {**config, "failed": error}
+    latencies = np.concatenate([latencies for latencies, _, _ in outcomes]) * 1000
+    return {
+        **config,
+        "essays_per_sec": round(sum(count for _, count, _ in outcomes) / max(elapsed for _, _, elapsed in outcomes), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+
+def choose(measurements, slo_ms):
+    """Best throughput among configurations meeting the p95 latency SLO (lowest p95 if none do)"""
+    measurements = [m for m in measurements if "failed" not in m]
+    if not measurements:
+        raise ValueError("Every configuration failed")
+    within = [m for m in measurements if m["p95_ms"] <= slo_ms]
+    if within:
+        return max(within, key=lambda m: m["essays_per_sec"]), True
+    return min(measurements, key=lambda m: m["p95_ms"]), False
+
+
+def _powers_of_two(limit):
+    return [2 ** i for i in range(limit.bit_length()) if 2 ** i <= limit]
+
+
+def main():
+    cpus = cpu_count()
+    parser = argparse.ArgumentParser(description="Find the fastest thread, batch and worker settings for the BERT scorer")
+    parser.add_argument("--slo-ms", type=float, default=LATENCY_SLO_MS,
+                        help=f"p95 latency budget per batch in milliseconds (default: {LATENCY_SLO_MS})")
+    parser.add_argument("--threads", type=int, nargs="+", default=_powers_of_two(cpus),
+                        help="Intra-op thread counts to try (default: powers of two up to the CPU count)")
+    parser.add_argument("--interop-threads", type=int, nargs="+", default=[1, 2],
+                        help="Inter-op thread counts to try (default: 1 2)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32],
+                        help="Batch sizes to try (default: 1 4 8 16 32)")
+    parser.add_argument("--processes", type=int, nargs="+", default=_powers_of_two(cpus),
+                        help="Worker process counts to try (default: powers of two up to the CPU count)")
+    parser.add_argument("--essays", type=int, default=64,
+                        help="Essays scored per process for each configuration (default: 64)")
+    parser.add_argument("--backend", default="torch",
+                        help="Inference backend to tune (default: torch)")
+    parser.add_argument("--timeout", type=float, default=MEASURE_TIMEOUT_SECONDS,
+                        help=f"Seconds before a configuration's workers are killed and it counts as failed "
+                             f"(default: {MEASURE_TIMEOUT_SECONDS})")
+    parser.add_argument("--output", default=TUNING_FILE,
+                        help=f"File to write the chosen configuration to (default: {TUNING_FILE})")
+    args = parser.parse_args()
+
+    # Configurations that would oversubscribe the cores are skipped
+    configs = [
+        (processes, intra, inter, batch_size)
+        for processes, intra, inter, batch_size in itertools.product(
+            args.processes, args.threads, args.interop_threads, args.batch_sizes
+        )
+        if processes * intra <= cpus
+    ]
+    measurements = []
+    for index, config in enumerate(configs, 1):
+        result = measure(*config, essays=args.essays, backend=args.backend, timeout=args.timeout)
+        measurements.append(result)
+        if "failed" in result:
+            print(f"[{index}/{len(configs)}] processes {result['processes']}, threads {result['intra_op_threads']}"
+                  f"/{result['inter_op_threads']}, batch {result['batch_size']}: failed ({result['failed']})", flush=True)
+            continue
+        print(f"[{index}/{len(configs)}] processes {result['processes']}, threads {result['intra_op_threads']}"
+              f"/{result['inter_op_threads']}, batch {result['batch_size']}: {result['essays_per_sec']:.2f} essays/sec, "
+              f"p95 {result['p95_ms']:.1f}ms", flush=True)
+
+    try:
+        best, meets_slo = choose(measurements, args.slo_ms)
+    except ValueError as e:
+        raise SystemExit(f"{e}; nothing written to {args.output}")
+    if not meets_slo:
+        print(f"WARNING: no configuration met the {args.slo_ms:.0f}ms p95 SLO; choosing the lowest-latency one")
+    tuning = {
+        "workers": best["processes"],
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": best["inter_op_threads"],
+        "batch_size": best["batch_size"],
+        "backend": args.backend,
+        "slo_ms": args.slo_ms,
+        "meets_slo": meets_slo,
+        "cpu_count": cpus,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "measurements": measurements,
+    }
+    with open(args.output, "w") as f:
+        json.dump(tuning, f, indent=2)
+    print(f"Chose {best['processes']} workers x {best['intra_op_threads']} threads "
+          f"(inter-op {best['inter_op_threads']}), batch size {best['batch_size']}: "
+          f"{best['essays_per_sec']:.2f} essays/sec, p95 {best['p95_ms']:.1f}ms. Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue is at capacity and cannot accept more work"""
+
+
+class MicroBatcher:
+    """Coalesce concurrent requests into batches for a blocking batch function.
+
+    Callers await `submit(item)`; items that arrive within `max_wait_ms` of the
+    first queued item (up to `max_batch_size`) are handed to `batch_fn` together
+    on a worker thread, and each caller receives its own entry of the result list.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5, max_queue=256):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._queue = None
+        self._worker = None
+        # A single thread keeps forward passes serialized; torch parallelizes within a batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batcher")
+        self.stats = {"requests": 0, "batches": 0, "rejected": 0, "max_batch_seen": 0, "last_batch_size": 0}
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, item):
+        """Queue an item and wait for its individual result"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            # The caller's timing breakdown travels with the item so batch stages can be credited to it
+            self._queue.put_nowait((item, future, time.perf_counter(), metrics.current_timings()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"Scoring queue is full ({self.max_queue} pending requests)")
+        self.stats["requests"] += 1
+        return await future
+
+    def run_batch(self, items):
+        """Run batch_fn on the batching thread from synchronous code, in turn with the coalesced batches"""
+        return self._executor.submit(self.batch_fn, items).result()
+
+    async def _collect(self):
+        # Block for the first item, then gather more until the batch fills or the window closes
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Skip callers that disconnected while waiting
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["last_batch_size"] = len(batch)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+            items = [item for item, _, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                results, batch_timings = await loop.run_in_executor(self._executor, metrics.collect, self.batch_fn, items)
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, enqueued, timings), result in zip(batch, results):
+                metrics.record("queue", started - enqueued, timings)
+                if timings is not None:
+                    for name, seconds in batch_timings.items():
+                        timings[name] = timings.get(name, 0.0) + seconds
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,249 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ("local", "remote", "feedback")
+ESSAY_LENGTHS = (50, 150, 300, 600)
+BATCH_SIZES = (1, 8, 32)
+THREAD_COUNTS = (1, 2, 4)
+REGRESSION_TOLERANCE = 0.25
+
+# Vocabulary for synthetic essays: ordinary prose, so token counts track real essays
+_WORDS = (
+    "the students argue that education should prepare young people for a changing world and that schools "
+    "must balance tradition with innovation while teachers encourage critical thinking curiosity and "
+    "collaboration in every classroom although some critics believe technology distracts learners from "
+    "reading writing and careful reasoning evidence suggests that thoughtful use of digital tools improves "
+    "engagement motivation and understanding for many different kinds of learners across communities"
+).split()
+
+
+def synthetic_essays(count, words, seed=0):
+    """Deterministic essays of `words` words; each one is unique so no cache can serve it"""
+    rng = random.Random(f"{seed}-{words}")
+    essays = []
+    for index in range(count):
+        sentences, total = [], 0
+        while total < words:
+            length = min(rng.randint(8, 20), words - total)
+            sentence = rng.choices(_WORDS, k=length)
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            total += length
+        essays.append(f"Essay {seed}-{index}. " + " ".join(sentences))
+    return essays
+
+
+def summarize(latencies, essays, elapsed):
+    """Latency percentiles in milliseconds and overall throughput for one run"""
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "essays_per_sec": round(essays / elapsed, 3),
+    }
+
+
+def bench_local(lengths, batch_sizes, thread_counts, essays_per_run, backend="torch"):
+    """Local BERT scorer: latency of each batch call, across batch sizes and torch thread counts"""
+    import torch
+    from inference import load_backend
+    from scoring import MODEL_PATH, predict_batch
+
+    tokenizer, model = load_backend(backend, MODEL_PATH, torch.device("cpu"))
+    results = []
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for words in lengths:
+            for batch_size in batch_sizes:
+                essays = synthetic_essays(essays_per_run, words, seed=batch_size)
+                predict_batch(essays[:batch_size], tokenizer, model, device=torch.device("cpu"))  # warm-up
+
+                latencies = []
+                started = time.perf_counter()
+                for i in range(0, len(essays), batch_size):
+                    batch_started = time.perf_counter()
+                    predict_batch(essays[i:i + batch_size], tokenizer, model, device=torch.device("cpu"))
+                    # Every essay in a batch waits for the whole batch
+                    latencies.extend([time.perf_counter() - batch_started] * len(essays[i:i + batch_size]))
+                elapsed = time.perf_counter() - started
+                results.append({
+                    "scenario": "local", "backend": backend, "words": words, "batch_size": batch_size,
+                    "threads": threads, **summarize(latencies, len(essays), elapsed),
+                })
+    return results
+
+
+def bench_remote(lengths, concurrency, essays_per_run, mock_latency=0.0):
+    """api/index.py `handler` served locally, calling the mock HF server, with concurrent clients"""
+    from mock_hf_server import start_mock_server
+
+    mock, base_url = start_mock_server(latency=mock_latency)
+    os.environ.update(HF_API_BASE=base_url, HF_API_TOKEN="bench")
+    sys.path.insert(0, os.path.join(ROOT, "api"))
+    import index
+
+    class QuietHandler(index.handler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    def post(text):
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        try:
+            connection.request("POST", "/", json.dumps({"text": text}), {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"handler returned HTTP {response.status}")
+        finally:
+            connection.close()
+        return time.perf_counter() - started
+
+    results = []
+    try:
+        post("Warm-up essay that opens the connection pool to the mock server.")
+        for words in lengths:
+            for clients in concurrency:
+                essays = synthetic_essays(essays_per_run, words, seed=1000 + clients)
+                with ThreadPoolExecutor(max_workers=clients) as pool:
+                    started = time.perf_counter()
+                    latencies = list(pool.map(post, essays))
+                    elapsed = time.perf_counter() - started
+                results.append({
+                    "scenario": "remote", "backend": "mock-hf", "words": words, "batch_size": 1,
+                    "threads": clients, **summarize(latencies, len(essays), elapsed),
+                })
+    finally:
+        server.shutdown()
+        mock.shutdown()
+    return results
+
+
+def bench_feedback(lengths, essays_per_run):
+    """Local BART feedback generation through app.generate_feedback, one essay at a time"""
+    sys.path.insert(0, ROOT)
+    import app
+
+    app.load_models()
+    results = []
+    for words in lengths:
+        essays = synthetic_essays(essays_per_run, words, seed=2000)
+        app.generate_feedback(f"Warm-up essay. {essays[0]}")
+        latencies = []
+        started = time.perf_counter()
+        for essay in essays:
+            essay_started = time.perf_counter()
+            app.generate_feedback(essay)
+            latencies.append(time.perf_counter() - essay_started)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "scenario": "feedback", "backend": "torch", "words": words, "batch_size": 1,
+            "threads": app.torch.get_num_threads(), **summarize(latencies, len(essays), elapsed),
+        })
+    return results
+
+
+def result_key(result):
+    return f"{result['scenario']}/{result['backend']}/words={result['words']}/batch={result['batch_size']}/threads={result['threads']}"
+
+
+def find_regressions(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Runs whose p95 latency grew, or whose throughput fell, by more than `tolerance` against the baseline"""
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result_key(result)}: p95 {base['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+        if result["essays_per_sec"] < base["essays_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{result_key(result)}: {base['essays_per_sec']:.2f} -> {result['essays_per_sec']:.2f} essays/sec"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoring and feedback latency and throughput")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=["local", "remote"],
+                        help="Paths to benchmark (default: local remote; feedback loads BART and is slow)")
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(ESSAY_LENGTHS),
+                        help=f"Essay lengths in words (default: {' '.join(map(str, ESSAY_LENGTHS))})")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES),
+                        help=f"Local batch sizes (default: {' '.join(map(str, BATCH_SIZES))})")
+    parser.add_argument("--threads", type=int, nargs="+", default=list(THREAD_COUNTS),
+                        help="Torch threads for the local path, concurrent clients for the remote path "
+                             f"(default: {' '.join(map(str, THREAD_COUNTS))})")
+    parser.add_argument("--essays", type=int, default=64,
+                        help="Essays per run (default: 64)")
+    parser.add_argument("--backend", default="torch",
+                        help="Inference backend for the local path (default: torch)")
+    parser.add_argument("--mock-latency", type=float, default=0.0,
+                        help="Seconds of artificial latency per mock HF call (default: 0)")
+    parser.add_argument("--output", default="bench_results.json",
+                        help="File to write the JSON results to (default: bench_results.json)")
+    parser.add_argument("--baseline", default="bench_baseline.json",
+                        help="Stored results to compare against (default: bench_baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help=f"Allowed relative slowdown before a run counts as a regression (default: {REGRESSION_TOLERANCE})")
+    args = parser.parse_args()
+
+    results = []
+    if "local" in args.scenarios:
+        results += bench_local(args.lengths, args.batch_sizes, args.threads, args.essays, args.backend)
+    if "remote" in args.scenarios:
+        results += bench_remote(args.lengths, args.threads, args.essays, args.mock_latency)
+    if "feedback" in args.scenarios:
+        results += bench_feedback(args.lengths, min(args.essays, 8))
+
+    for result in results:
+        print(f"{result_key(result)}: p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms, "
+              f"p99 {result['p99_ms']:.1f}ms, {result['essays_per_sec']:.2f} essays/sec")
+
+    report = {"machine": platform.machine(), "cpus": os.cpu_count(), "python": platform.python_version(),
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not Path(args.baseline).exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        regressions = find_regressions(results, json.load(f), args.tolerance)
+    if regressions:
+        print("Regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
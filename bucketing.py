@@ -0,0 +1,94 @@
+import threading
+
+# Start a new bucket once this fraction of a padded batch would be padding
+MAX_PADDING_RATIO = 0.2
+
+
+def bucket_batches(lengths, max_batch_size, max_padding_ratio=MAX_PADDING_RATIO):
+    """Group sequence indices into batches of similar length.
+
+    Indices are sorted by token count and split greedily: a batch is closed when
+    it is full or when adding the next (longer) sequence would push the share of
+    padding tokens in the batch above `max_padding_ratio`.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current, current_tokens = [], 0
+    for i in order:
+        length = lengths[i]
+        padded = (len(current) + 1) * length
+        waste = (padded - current_tokens - length) / padded if padded else 0.0
+        if current and (len(current) >= max_batch_size or waste > max_padding_ratio):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += length
+    if current:
+        batches.append(current)
+    return batches
+
+
+def naive_batches(lengths, max_batch_size):
+    """Split indices into arrival-order batches, as an unsorted batcher would"""
+    return [list(range(i, min(i + max_batch_size, len(lengths)))) for i in range(0, len(lengths), max_batch_size)]
+
+
+def padded_cost(lengths, batches):
+    """Return (padded tokens, sum of squared padded lengths) for a batching plan"""
+    tokens, attention = 0, 0
+    for batch in batches:
+        width = max(lengths[i] for i in batch)
+        tokens += width * len(batch)
+        attention += width * width * len(batch)
+    return tokens, attention
+
+
+class PaddingStats:
+    """Running totals comparing bucketed batching against naive arrival-order batching"""
+
+    _FIELDS = ("real_tokens", "padded_tokens", "naive_padded_tokens",
+               "attention_cost", "naive_attention_cost", "batches")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.naive_padded_tokens = 0
+        self.attention_cost = 0
+        self.naive_attention_cost = 0
+        self.batches = 0
+
+    def record(self, lengths, batches, max_batch_size):
+        tokens, attention = padded_cost(lengths, batches)
+        naive_tokens, naive_attention = padded_cost(lengths, naive_batches(lengths, max_batch_size))
+        with self._lock:
+            self.real_tokens += sum(lengths)
+            self.padded_tokens += tokens
+            self.naive_padded_tokens += naive_tokens
+            self.attention_cost += attention
+            self.naive_attention_cost += naive_attention
+            self.batches += len(batches)
+
+    def counts(self):
+        """Raw totals, picklable so worker processes can report them"""
+        with self._lock:
+            return {name: getattr(self, name) for name in self._FIELDS}
+
+    def merge(self, counts):
+        with self._lock:
+            for name in self._FIELDS:
+                setattr(self, name, getattr(self, name) + counts[name])
+
+    def summary(self):
+        with self._lock:
+            def ratio(padded):
+                return 1 - self.real_tokens / padded if padded else 0.0
+
+            return {
+                "batches": self.batches,
+                "padding_ratio": round(ratio(self.padded_tokens), 4),
+                "naive_padding_ratio": round(ratio(self.naive_padded_tokens), 4),
+                "attention_flops_saved": round(
+                    1 - self.attention_cost / self.naive_attention_cost if self.naive_attention_cost else 0.0, 4
+                ),
+            }
@@ -0,0 +1,168 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+from pathlib import Path
+
+from bucketing import PaddingStats
+from engine import score_value
+from scoring import MODEL_PATH, MAX_LEN
+
+# Per-process model state, populated by the pool initializer
+_worker_state = {}
+
+
+def _init_worker(model_path, backend, num_threads, options):
+    """Load the tokenizer and model once per worker process"""
+    import torch
+    from inference import load_backend
+    from tokenization import TokenizationStage
+
+    torch.set_num_threads(num_threads)
+    tokenizer, model = load_backend(backend, model_path, torch.device("cpu"))
+    # The process pool already spreads work across cores, so tokenize on the worker's own thread
+    tokenizer = TokenizationStage(tokenizer, workers=1)
+    _worker_state.update(tokenizer=tokenizer, model=model, options=options)
+
+
+def _score_chunk(chunk):
+    """Score one chunk of (id, text) pairs inside a worker"""
+    import torch
+    from scoring import predict_batch, predict_long
+
+    # The chunk spans several batches so essays can be bucketed by length before padding
+    stats = PaddingStats()
+    texts = [text for _, text in chunk]
+    options = dict(_worker_state["options"])
+    predict = predict_long if options.pop("long_doc", False) else predict_batch
+    results = predict(
+        texts, _worker_state["tokenizer"], _worker_state["model"], device=torch.device("cpu"), stats=stats, **options
+    )
+    rows = [
+        {"id": essay_id, "score": score_value(label), "confidence": round(confidence, 6)}
+        for (essay_id, _), (label, confidence, _) in zip(chunk, results)
+    ]
+    return rows, stats.counts()
+
+
+def read_essays(path, text_field="text", id_field="id"):
+    """Stream (id, text) pairs from a CSV or JSONL file without loading it into memory"""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        csv.field_size_limit(sys.maxsize)
+        with open(path, newline="", encoding="utf-8") as f:
+            for index, row in enumerate(csv.DictReader(f)):
+                yield row.get(id_field) or index, row[text_field]
+    else:
+        with open(path, encoding="utf-8") as f:
+            index = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield record.get(id_field, index), record[text_field]
+                index += 1
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Checkpoint:
+    """Tracks how many input records have been durably written to the output file"""
+
+    def __init__(self, output_path):
+        self.path = Path(f"{output_path}.ckpt")
+
+    def load(self):
+        if not self.path.exists():
+            return {"records": 0, "bytes": 0}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def commit(self, records, nbytes):
+        tmp_path = self.path.with_suffix(".ckpt.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"records": records, "bytes": nbytes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+def run_batch(input_path, output_path, workers=1, batch_size=32, text_field="text",
+              id_field="id", model_path=MODEL_PATH, max_length=MAX_LEN, resume=True, sort_window=8,
+              long_doc=False, window_strategy="mean", backend="torch", num_threads=None):
+    """Score every essay in input_path and append JSONL results to output_path"""
+    if long_doc:
+        options = {"long_doc": True, "strategy": window_strategy, "batch_size": batch_size}
+    else:
+        options = {"max_length": max_length, "batch_size": batch_size}
+
+    checkpoint = Checkpoint(output_path)
+    state = checkpoint.load() if resume and os.path.exists(output_path) else {"records": 0, "bytes": 0}
+    committed = state["records"]
+
+    # Drop anything written after the last commit so a killed job never duplicates rows
+    out = open(output_path, "r+b" if committed else "wb")
+    out.truncate(state["bytes"])
+    out.seek(state["bytes"])
+    if committed:
+        print(f"Resuming after {committed} committed records")
+
+    essays = islice(read_essays(input_path, text_field, id_field), committed, None)
+    num_threads = num_threads or max(1, cpu_count() // workers)
+    # Keep a bounded number of chunks in flight so memory stays flat on any input size
+    max_in_flight = workers * 2
+    started = time.perf_counter()
+    scored = 0
+    padding_stats = PaddingStats()
+
+    initargs = (model_path, backend, num_threads, options)
+    with Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending = deque()
+        chunks = _chunks(essays, batch_size * sort_window)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.append(pool.apply_async(_score_chunk, (chunk,)))
+            if not pending:
+                break
+
+            # Results are committed strictly in input order
+            rows, counts = pending.popleft().get()
+            padding_stats.merge(counts)
+            out.write("".join(json.dumps(row) + "\n" for row in rows).encode("utf-8"))
+            out.flush()
+            os.fsync(out.fileno())
+            committed += len(rows)
+            scored += len(rows)
+            checkpoint.commit(committed, out.tell())
+
+            elapsed = time.perf_counter() - started
+            print(f"Scored {committed} essays ({scored / elapsed:.1f} essays/sec)", flush=True)
+
+    out.close()
+    checkpoint.clear()
+    summary = padding_stats.summary()
+    print(
+        f"Padding ratio {summary['padding_ratio']:.1%} vs {summary['naive_padding_ratio']:.1%} unsorted; "
+        f"attention FLOPs saved {summary['attention_flops_saved']:.1%}"
+    )
+    return committed
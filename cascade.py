@@ -0,0 +1,222 @@
+import argparse
+import random
+import threading
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from metrics import stage
+from scoring import MODEL_PATH, MAX_LEN, DEVICE, encode, predict_sequences
+
+# First-stage weights are stored next to the BERT weights they were distilled from
+CASCADE_FILE = "cascade_linear.npz"
+CASCADE_THRESHOLD = 0.9
+# Fraction of confident essays also scored by BERT to keep measuring agreement
+CASCADE_AUDIT_RATE = 0.02
+
+
+def _pool(weights, sequences):
+    """Mean of the weight rows of each sequence's token ids: a linear model over bag-of-token frequencies"""
+    lengths = np.array([len(ids) for ids in sequences])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    rows = weights[np.concatenate([np.asarray(ids) for ids in sequences])]
+    return np.add.reduceat(rows, starts, axis=0) / lengths[:, None]
+
+
+def _softmax(logits):
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class TokenLinearModel:
+    """Softmax regression over the tokenizer's ids, distilled from the full BERT classifier"""
+
+    def __init__(self, weights, bias):
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["weights"], data["bias"])
+
+    def save(self, path):
+        np.savez(path, weights=self.weights, bias=self.bias)
+
+    def predict_proba(self, sequences):
+        return _softmax(_pool(self.weights, sequences) + self.bias)
+
+    @classmethod
+    def fit(cls, sequences, targets, vocab_size, epochs=30, learning_rate=2.0, l2=1e-6, batch_size=256, seed=0):
+        """Minimize cross-entropy against BERT's probabilities (soft targets) with minibatch SGD"""
+        weights = np.zeros((vocab_size, targets.shape[1]), dtype=np.float32)
+        bias = np.log(targets.mean(axis=0) + 1e-6).astype(np.float32)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(sequences))
+            for start in range(0, len(order), batch_size):
+                chunk = order[start:start + batch_size]
+                batch = [sequences[i] for i in chunk]
+                grad = (_softmax(_pool(weights, batch) + bias) - targets[chunk]) / len(chunk)
+                lengths = np.array([len(ids) for ids in batch])
+
+                weight_grad = np.zeros_like(weights)
+                ids = np.concatenate([np.asarray(ids) for ids in batch])
+                np.add.at(weight_grad, ids, np.repeat(grad / lengths[:, None], lengths, axis=0))
+                weights -= learning_rate * (weight_grad + l2 * weights)
+                bias -= learning_rate * grad.sum(axis=0)
+        return cls(weights, bias)
+
+
+class CascadeStats:
+    """Running escalation rate and audited agreement between the first stage and BERT"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.essays = 0
+        self.escalated = 0
+        self.audited = 0
+        self.agreed = 0
+        self._lock = threading.Lock()
+
+    def record(self, essays, escalated, audited, agreed):
+        with self._lock:
+            self.essays += essays
+            self.escalated += escalated
+            self.audited += audited
+            self.agreed += agreed
+
+    def summary(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "essays": self.essays,
+                "escalation_rate": self.escalated / self.essays if self.essays else None,
+                "audited": self.audited,
+                "agreement": self.agreed / self.audited if self.audited else None,
+            }
+
+
+def load_first_stage(model_path=MODEL_PATH):
+    path = Path(model_path) / CASCADE_FILE
+    return TokenLinearModel.load(path) if path.exists() else None
+
+
+def predict_cascade(texts, tokenizer, model, first_stage, device=DEVICE, max_length=MAX_LEN,
+                    threshold=CASCADE_THRESHOLD, audit_rate=CASCADE_AUDIT_RATE, batch_size=None,
+                    stats=None, cascade_stats=None):
+    """Score essays with the linear first stage, sending only low-confidence ones through BERT"""
+    if not texts:
+        return []
+
+    with stage("tokenize"):
+        sequences = encode(texts, tokenizer, max_length)
+    with stage("first_stage"):
+        probabilities = list(first_stage.predict_proba(sequences))
+
+    confident = [i for i, probs in enumerate(probabilities) if probs.max() >= threshold]
+    audit = [i for i in confident if random.random() < audit_rate]
+    escalated = set(range(len(texts))) - set(confident)
+    escalate = sorted(escalated)
+
+    agreed = 0
+    run = escalate + audit
+    if run:
+        full = predict_sequences(
+            [sequences[i] for i in run], model, device, batch_size=batch_size,
+            pad_token_id=tokenizer.pad_token_id, stats=stats,
+        )
+        for i, probs in zip(run, full):
+            if i in escalated:
+                probabilities[i] = probs
+            else:
+                agreed += int(probs.argmax() == probabilities[i].argmax())
+
+    if cascade_stats is not None:
+        cascade_stats.record(len(texts), len(escalate), len(audit), agreed)
+
+    results = []
+    for probs in probabilities:
+        label = int(probs.argmax())
+        results.append((label, float(probs[label]), probs))
+    return results
+
+
+def _bert_probabilities(sequences, tokenizer, model, batch_size):
+    return np.stack(predict_sequences(sequences, model, DEVICE, batch_size=batch_size,
+                                      pad_token_id=tokenizer.pad_token_id))
+
+
+def evaluate(first_stage, sequences, reference, thresholds, bert_seconds):
+    """Escalation rate, agreement with BERT and estimated speedup for each threshold"""
+    started = time.perf_counter()
+    first = first_stage.predict_proba(sequences)
+    first_seconds = time.perf_counter() - started
+
+    rows = []
+    for threshold in thresholds:
+        confident = first.max(axis=1) >= threshold
+        labels = np.where(confident, first.argmax(axis=1), reference.argmax(axis=1))
+        escalation = 1 - confident.mean()
+        rows.append({
+            "threshold": threshold,
+            "escalation_rate": float(escalation),
+            "agreement": float((labels == reference.argmax(axis=1)).mean()),
+            "confident_agreement": float((first.argmax(axis=1) == reference.argmax(axis=1))[confident].mean())
+            if confident.any() else None,
+            "speedup": float(bert_seconds / (first_seconds + escalation * bert_seconds)),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or evaluate the first-stage scorer of the confidence cascade")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--essays", required=True,
+                        help="CSV or JSONL file of essays; BERT's own predictions are the training targets")
+    parser.add_argument("--text-field", default="text",
+                        help="Column or key holding the essay text (default: text)")
+    parser.add_argument("--limit", type=int, default=20000,
+                        help="Number of essays to use (default: 20000)")
+    parser.add_argument("--holdout", type=float, default=0.1,
+                        help="Fraction of essays held out for evaluation after training (default: 0.1)")
+    parser.add_argument("--epochs", type=int, default=30,
+                        help="Training epochs (default: 30)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9, 0.95],
+                        help="Confidence thresholds to report (default: 0.6 0.7 0.8 0.9 0.95)")
+    parser.add_argument("--batch-size", type=int, default=32,
+                        help="Essays per BERT forward pass (default: 32)")
+    args = parser.parse_args()
+
+    from bulk import read_essays
+    from scoring import load_model
+
+    tokenizer, model = load_model()
+    texts = [text for _, text in islice(read_essays(args.essays, args.text_field), args.limit)]
+    sequences = encode(texts, tokenizer, MAX_LEN)
+    started = time.perf_counter()
+    reference = _bert_probabilities(sequences, tokenizer, model, args.batch_size)
+    bert_seconds = time.perf_counter() - started
+
+    path = Path(MODEL_PATH) / CASCADE_FILE
+    if args.command == "train":
+        split = int(len(sequences) * (1 - args.holdout))
+        first_stage = TokenLinearModel.fit(sequences[:split], reference[:split], tokenizer.vocab_size, args.epochs)
+        first_stage.save(path)
+        print(f"Saved first stage to {path}")
+        sequences, reference = sequences[split:], reference[split:]
+        bert_seconds *= len(sequences) / len(texts)
+    else:
+        first_stage = TokenLinearModel.load(path)
+
+    for row in evaluate(first_stage, sequences, reference, args.thresholds, bert_seconds):
+        confident = "n/a" if row["confident_agreement"] is None else f"{row['confident_agreement']:.2%}"
+        print(f"threshold {row['threshold']:.2f}: escalation {row['escalation_rate']:.1%}, "
+              f"agreement {row['agreement']:.2%} (first stage alone {confident}), "
+              f"~{row['speedup']:.1f}x faster than BERT alone")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+import torch
+
+from scoring import MODEL_PATH, MAX_LEN
+
+# Compiled inference: "trace" (TorchScript, one graph per length bucket), "compile" (torch.compile) or "off"
+COMPILE_MODE = os.environ.get("COMPILE_MODE", "off")
+# Padded sequence lengths the model is specialized for; batches are padded up to the nearest one
+COMPILE_BUCKETS = tuple(int(length) for length in os.environ.get("COMPILE_BUCKETS", "64,128,192,256").split(","))
+COMPILE_MODES = ("trace", "compile")
+# Batch size used to warm up each bucket and time it against eager mode
+WARMUP_BATCH_SIZE = 8
+WARMUP_REPEATS = 3
+
+
+class _Logits(torch.nn.Module):
+    """Positional inputs and a plain logits tensor, which tracing and compilation both handle"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids,
+                          return_dict=False)[0]
+
+
+def bucket_lengths(max_length=MAX_LEN, buckets=COMPILE_BUCKETS):
+    """Sorted bucket lengths up to max_length, always including max_length itself"""
+    return sorted({length for length in buckets if length < max_length} | {max_length})
+
+
+def _sample(batch_size, length, vocab_size, device, pad_token_id=None):
+    generator = torch.Generator().manual_seed(length)
+    input_ids = torch.randint(1000, vocab_size, (batch_size, length), generator=generator)
+    attention_mask = torch.ones_like(input_ids)
+    if pad_token_id is not None:
+        # Right padding of a different width per row, as real bucketed batches have
+        for row in range(1, batch_size):
+            real = max(1, length - row * length // (batch_size + 1))
+            input_ids[row, real:] = pad_token_id
+            attention_mask[row, real:] = 0
+    return input_ids.to(device), attention_mask.to(device), torch.zeros_like(input_ids).to(device)
+
+
+def _time(fn, inputs, repeats=WARMUP_REPEATS):
+    with torch.inference_mode():
+        fn(*inputs)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            fn(*inputs)
+    return (time.perf_counter() - started) / repeats
+
+
+class CompiledClassifier:
+    """BertForSequenceClassification specialized for a few padded sequence lengths.
+
+    Each batch is padded (with masked positions) up to the nearest bucket and run
+    through the graph built for that length; batches longer than the largest bucket
+    run in eager mode. Everything else (config, state_dict, ...) is the eager model's.
+    """
+
+    def __init__(self, model, mode="trace", buckets=None, max_length=MAX_LEN, pad_token_id=0):
+        if mode not in COMPILE_MODES:
+            raise ValueError(f"Unknown compile mode '{mode}', expected one of {COMPILE_MODES}")
+        self.model = model
+        self.mode = mode
+        self.buckets = bucket_lengths(max_length, buckets or COMPILE_BUCKETS)
+        self.pad_token_id = pad_token_id
+        self.stats = {"compiled": 0, "eager": 0}
+        self.report = None
+        self._graphs = {}
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself
+        return getattr(self.__dict__["model"], name)
+
+    def build(self, warmup_batch_size=WARMUP_BATCH_SIZE):
+        """Trace or compile every bucket, check it against eager mode and time both"""
+        started = time.perf_counter()
+        wrapped = _Logits(self.model).eval()
+        vocab_size = self.model.config.vocab_size
+        device = next(self.model.parameters()).device
+        compiled = torch.compile(wrapped, dynamic=False) if self.mode == "compile" else None
+        timings = {}
+        for length in self.buckets:
+            inputs = _sample(warmup_batch_size, length, vocab_size, device)
+            if self.mode == "trace":
+                with torch.no_grad():
+                    graph = torch.jit.trace(wrapped, inputs, check_trace=False)
+            else:
+                graph = compiled
+            self._graphs[length] = graph
+            self._check(length, wrapped, vocab_size, device)
+            eager_seconds = _time(wrapped, inputs)
+            compiled_seconds = _time(self._run_graph(length), inputs)
+            timings[length] = {
+                "eager_ms": round(eager_seconds * 1000, 2),
+                "compiled_ms": round(compiled_seconds * 1000, 2),
+                "speedup": round(eager_seconds / compiled_seconds, 3),
+            }
+
+        eager_total = sum(row["eager_ms"] for row in timings.values())
+        compiled_total = sum(row["compiled_ms"] for row in timings.values())
+        self.report = {
+            "mode": self.mode,
+            "warmup_batch_size": warmup_batch_size,
+            "build_seconds": round(time.perf_counter() - started, 3),
+            "speedup": round(eager_total / compiled_total, 3),
+            "buckets": timings,
+        }
+        return self
+
+    def _run_graph(self, length):
+        graph = self._graphs[length]
+        if self.mode != "compile":
+            return graph
+
+        def run(input_ids, attention_mask, token_type_ids):
+            # One graph per bucket length shared by batch sizes above 1; single essays get their own
+            if input_ids.shape[0] > 1:
+                for tensor in (input_ids, attention_mask, token_type_ids):
+                    torch._dynamo.mark_dynamic(tensor, 0)
+            return graph(input_ids, attention_mask, token_type_ids)
+        return run
+
+    def _check(self, length, wrapped, vocab_size, device):
+        # Traced graphs can silently bake in the batch size or mask, so compare against eager at other
+        # sizes and with padded rows too
+        for batch_size, pad_token_id in ((1, None), (3, None), (3, self.pad_token_id)):
+            inputs = _sample(batch_size, length, vocab_size, device, pad_token_id)
+            with torch.inference_mode():
+                expected = wrapped(*inputs)
+                actual = self._run_graph(length)(*inputs)
+            if actual.shape != expected.shape or not torch.allclose(actual.float(), expected.float(), atol=1e-3):
+                raise RuntimeError(f"{self.mode} graph for length {length} does not match eager mode")
+
+    def __call__(self, input_ids, attention_mask, token_type_ids=None, **kwargs):
+        if token_type_ids is None:
+            token_type_ids = torch.zeros_like(input_ids)
+        width = input_ids.shape[1]
+        bucket = next((length for length in self.buckets if length >= width), None)
+        if bucket is None or kwargs:
+            self.stats["eager"] += 1
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids,
+                              **kwargs)
+
+        padding = bucket - width
+        if padding:
+            input_ids = torch.nn.functional.pad(input_ids, (0, padding), value=self.pad_token_id)
+            attention_mask = torch.nn.functional.pad(attention_mask, (0, padding), value=0)
+            token_type_ids = torch.nn.functional.pad(token_type_ids, (0, padding), value=0)
+        self.stats["compiled"] += 1
+        with torch.inference_mode():
+            logits = self._run_graph(bucket)(input_ids, attention_mask, token_type_ids)
+        return SimpleNamespace(logits=logits)
+
+    def eval(self):
+        return self
+
+    def summary(self):
+        return {**(self.report or {}), **self.stats}
+
+
+def compile_classifier(model, mode=COMPILE_MODE, buckets=None, max_length=MAX_LEN, pad_token_id=0):
+    """Return a warmed-up CompiledClassifier, or the eager model if compilation is off or unavailable"""
+    if mode == "off":
+        return model
+    if not isinstance(model, torch.nn.Module):
+        print(f"WARNING: COMPILE_MODE={mode} only applies to torch models; using {type(model).__name__} as is")
+        return model
+    if mode == "compile" and not hasattr(torch, "compile"):
+        print("WARNING: torch.compile needs PyTorch 2.0 or newer; falling back to eager mode")
+        return model
+    try:
+        compiled = CompiledClassifier(model, mode, buckets, max_length, pad_token_id).build()
+    except Exception as e:
+        print(f"WARNING: could not {mode} the scorer ({type(e).__name__}: {e}); falling back to eager mode")
+        return model
+
+    report = compiled.report
+    print(f"Compiled scorer ({mode}) in {report['build_seconds']:.1f}s: "
+          + ", ".join(f"{length} tokens {row['compiled_ms']:.1f}ms vs {row['eager_ms']:.1f}ms eager"
+                      for length, row in report["buckets"].items())
+          + f" ({report['speedup']:.2f}x overall)")
+    return compiled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compiled and eager inference of the BERT scorer per length bucket")
+    parser.add_argument("--mode", choices=COMPILE_MODES, default="trace",
+                        help="How to build the compiled model (default: trace)")
+    parser.add_argument("--buckets", type=int, nargs="+", default=list(COMPILE_BUCKETS),
+                        help=f"Padded sequence lengths to specialize for (default: {' '.join(map(str, COMPILE_BUCKETS))})")
+    parser.add_argument("--max-length", type=int, default=MAX_LEN,
+                        help=f"Longest sequence to compile for (default: {MAX_LEN})")
+    parser.add_argument("--batch-size", type=int, default=WARMUP_BATCH_SIZE,
+                        help=f"Batch size to time each bucket at (default: {WARMUP_BATCH_SIZE})")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch intra-op threads (default: torch's own choice)")
+    args = parser.parse_args()
+
+    from scoring import load_model
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer, model = load_model(MODEL_PATH, torch.device("cpu"))
+    compiled = CompiledClassifier(model, args.mode, args.buckets, args.max_length, tokenizer.pad_token_id)
+    report = compiled.build(args.batch_size).report
+    for length, row in report["buckets"].items():
+        print(f"{length:>4} tokens: eager {row['eager_ms']:8.2f}ms, {args.mode} {row['compiled_ms']:8.2f}ms, "
+              f"{row['speedup']:.2f}x")
+    print(f"Built in {report['build_seconds']:.1f}s; {report['speedup']:.2f}x faster than eager overall "
+          f"at batch size {args.batch_size}")
+
+
+if __name__ == "__main__":
+    main()
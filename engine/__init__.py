@@ -0,0 +1,16 @@
+"""Scoring engine shared by the Streamlit app, its FastAPI server and the Vercel function.
+
+Backends (local torch or quantized models, or the remote Inference API) implement one
+interface and report scores on one scale; the Engine routes each call between them.
+"""
+from engine.base import FEEDBACK_SECTIONS, SCORE_CLASSES, Backend, EngineError, score_value
+from engine.router import Engine
+
+# Backend names accepted in ENGINE_BACKENDS; the local ones are the inference backends of inference.py
+LOCAL_BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+REMOTE_BACKEND = "remote"
+
+__all__ = [
+    "FEEDBACK_SECTIONS", "LOCAL_BACKENDS", "REMOTE_BACKEND", "SCORE_CLASSES",
+    "Backend", "Engine", "EngineError", "score_value",
+]
@@ -0,0 +1,46 @@
+# Essay scores behind the BERT classifier's output indices (the classes of label_encoder.pkl).
+# Every backend returns probabilities over these, so a score means the same whichever backend produced it.
+SCORE_CLASSES = tuple(range(51)) + (55, 60)
+FEEDBACK_SECTIONS = ["Grammar and Spelling", "Clarity and Coherence", "Structure and Organization"]
+
+
+class EngineError(Exception):
+    """Raised when no backend could serve a request"""
+
+
+def score_value(label):
+    """The essay score a label index stands for"""
+    return SCORE_CLASSES[label]
+
+
+def nearest_label(score):
+    """Label index of the class closest to an essay score"""
+    return min(range(len(SCORE_CLASSES)), key=lambda label: abs(SCORE_CLASSES[label] - score))
+
+
+def to_result(probs):
+    """(label, confidence, probabilities) for a probability vector over SCORE_CLASSES"""
+    label = max(range(len(probs)), key=probs.__getitem__)
+    return label, float(probs[label]), probs
+
+
+class Backend:
+    """One way of scoring essays and generating feedback, as seen by the Engine.
+
+    score() returns a (label, confidence, probabilities) tuple per essay, with
+    probabilities over SCORE_CLASSES. feedback() returns one text per
+    FEEDBACK_SECTIONS entry. Both raise on failure so the engine can try another backend.
+    """
+
+    name = None
+
+    def score(self, texts):
+        raise NotImplementedError
+
+    def feedback(self, text):
+        raise NotImplementedError
+
+    def feedback_sections(self, text):
+        """Yield (index, text, ok) for each section as it becomes available"""
+        for index, section in enumerate(self.feedback(text)):
+            yield index, section, True
@@ -0,0 +1,29 @@
+from engine.base import Backend, EngineError
+
+
+class LocalBackend(Backend):
+    """BERT scoring and BART feedback in this process, with the models held by a ModelRegistry.
+
+    The scorer is a registry entry yielding (tokenizer, model). The work itself is done
+    by predict_fn(texts, tokenizer, model, device) and generate_fn(generator, text), so
+    the torch and quantized backends share the app's cascade, long-document and batching logic.
+    """
+
+    def __init__(self, name, registry, scorer, device, predict_fn, generate_fn, feedback="feedback"):
+        self.name = name
+        self.registry = registry
+        self.scorer = scorer
+        self.device = device
+        self.predict_fn = predict_fn
+        self.generate_fn = generate_fn
+        self.feedback_model = feedback
+
+    def score(self, texts):
+        with self.registry.use(self.scorer) as (tokenizer, model):
+            return self.predict_fn(texts, tokenizer, model, self.device)
+
+    def feedback(self, text):
+        with self.registry.use(self.feedback_model) as generator:
+            if generator is None:
+                raise EngineError("Feedback model not available")
+            return self.generate_fn(generator, text)
@@ -0,0 +1,108 @@
+import asyncio
+
+from engine.base import SCORE_CLASSES, Backend, nearest_label, to_result
+from hf_client import HF_DEADLINE, HFError, deadline_in, get_client, iter_sync, run_sync
+
+# Hugging Face Inference API models; HF_API_BASE can point at mock_hf_server.py for local testing
+SCORE_MODEL = "facebook/bart-large-mnli"
+FEEDBACK_MODEL = "facebook/bart-large-cnn"
+SCORE_LABELS = ["poor essay", "average essay", "good essay", "excellent essay"]
+# Zero-shot labels on a 1-5 scale, stretched onto the range of SCORE_CLASSES
+SCORE_MAP = {
+    "poor essay": 1,
+    "average essay": 3,
+    "good essay": 4,
+    "excellent essay": 5
+}
+FEEDBACK_UNAVAILABLE = "The feedback service is currently experiencing technical difficulties. Please try again later."
+
+
+def feedback_prompts(text):
+    """Create prompts for different aspects of feedback"""
+    return [
+        f"Identify grammar and spelling errors in this essay and provide specific suggestions for improvement: {text[:300]}",
+        f"Evaluate the clarity and coherence of this essay. What could be improved?: {text[:300]}",
+        f"Analyze the structure and organization of this essay and provide constructive feedback: {text[:300]}"
+    ]
+
+
+def label_for(name):
+    return nearest_label(SCORE_MAP.get(name, 3) / 5 * max(SCORE_CLASSES))
+
+
+def parse_score(result):
+    """Map a zero-shot classification result onto SCORE_CLASSES"""
+    if not (isinstance(result, dict) and "scores" in result):
+        raise HFError("Unexpected classification response")
+
+    probs = [0.0] * len(SCORE_CLASSES)
+    for name, score in zip(result["labels"], result["scores"]):
+        probs[label_for(name)] += score
+    return to_result(probs)
+
+
+class RemoteBackend(Backend):
+    """BART-MNLI zero-shot scoring and BART-CNN feedback through the Hugging Face Inference API"""
+
+    name = "remote"
+
+    def __init__(self, token, base_url=None, deadline=HF_DEADLINE):
+        self.token = token
+        self.base_url = base_url
+        self.deadline = deadline
+
+    @property
+    def client(self):
+        return get_client(self.token, self.base_url)
+
+    async def _score(self, texts):
+        deadline = deadline_in(self.deadline)
+        results = await asyncio.gather(
+            *(self.client.classify(SCORE_MODEL, text[:1000], SCORE_LABELS, deadline) for text in texts)
+        )
+        return [parse_score(result) for result in results]
+
+    def score(self, texts):
+        return run_sync(self._score(texts))
+
+    async def _section(self, index, prompt, deadline):
+        try:
+            return index, await self.client.generate(FEEDBACK_MODEL, prompt, deadline), None
+        except HFError as e:
+            return index, FEEDBACK_UNAVAILABLE, e
+
+    async def _sections(self, text):
+        # All prompts are in flight at once; sections are yielded in the order they finish
+        deadline = deadline_in(self.deadline)
+        tasks = [asyncio.ensure_future(self._section(index, prompt, deadline))
+                 for index, prompt in enumerate(feedback_prompts(text))]
+        failed, succeeded = [], False
+        try:
+            for task in asyncio.as_completed(tasks):
+                index, section, error = await task
+                if error is None:
+                    succeeded = True
+                    yield index, section, True
+                else:
+                    print(f"Error in feedback generation: {str(error)}")
+                    failed.append((index, error))
+                if succeeded:
+                    # Failed sections fall back to a message once at least one prompt has come through
+                    for failed_index, _ in failed:
+                        yield failed_index, FEEDBACK_UNAVAILABLE, False
+                    failed = []
+            if not succeeded:
+                # Every prompt failed: give up so the engine can ask another backend
+                raise failed[-1][1]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def feedback_sections(self, text):
+        yield from iter_sync(self._sections(text))
+
+    def feedback(self, text):
+        sections = [FEEDBACK_UNAVAILABLE] * len(feedback_prompts(text))
+        for index, section, _ in self.feedback_sections(text):
+            sections[index] = section
+        return sections
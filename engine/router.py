@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+
+from engine.base import FEEDBACK_SECTIONS, EngineError
+
+# A call slower than this per essay counts against the backend's health even when it succeeds
+ENGINE_SLOW_SECONDS = float(os.environ.get("ENGINE_SLOW_SECONDS", 5))
+# Consecutive errors or slow calls that open a backend's circuit, and how long it then stays out of rotation
+ENGINE_FAILURE_THRESHOLD = int(os.environ.get("ENGINE_FAILURE_THRESHOLD", 3))
+ENGINE_COOLDOWN_SECONDS = float(os.environ.get("ENGINE_COOLDOWN_SECONDS", 30))
+# Weight of the newest call in the smoothed per-essay latency
+LATENCY_SMOOTHING = 0.2
+OPERATIONS = ("score", "feedback")
+
+
+class BackendHealth:
+    """Smoothed latency, load and circuit state of one backend for one operation"""
+
+    def __init__(self):
+        self.latency = None
+        self.inflight = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.stats = {"calls": 0, "errors": 0, "slow": 0, "opened": 0}
+
+    def state(self, now):
+        if not self.open_until:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+
+class Engine:
+    """Routes each call to the primary backend, failing over on errors or an open circuit.
+
+    Health is kept per backend and operation, so a missing feedback model never takes
+    the scorer out of rotation. The primary (first configured) backend gets every call
+    while its circuit is not open, so its results stay the cacheable ones. Fallbacks are
+    tried in order of expected cost: their smoothed per-essay latency for the operation
+    times the calls they already have in flight, with backends not yet measured after the
+    measured ones, in configured order. After failure_threshold
+    consecutive errors or slow calls a circuit opens: the backend gets no traffic for that
+    operation for cooldown seconds, then a single probe call decides whether it closes
+    again. Slowness alone never opens the circuit of the last backend still in rotation.
+    """
+
+    def __init__(self, backends, slow_seconds=ENGINE_SLOW_SECONDS, failure_threshold=ENGINE_FAILURE_THRESHOLD,
+                 cooldown=ENGINE_COOLDOWN_SECONDS):
+        if not backends:
+            raise ValueError("The engine needs at least one backend")
+        self.backends = list(backends)
+        self.slow_seconds = slow_seconds
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health = {(backend.name, operation): BackendHealth()
+                       for backend in self.backends for operation in OPERATIONS}
+        self.stats = {"requests": 0, "failovers": 0, "unavailable": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        """Name of the first configured backend, whose results callers may treat as authoritative"""
+        return self.backends[0].name
+
+    def _ranked(self, operation):
+        now = time.monotonic()
+        with self._lock:
+            ranked = []
+            for order, backend in enumerate(self.backends):
+                health = self.health[backend.name, operation]
+                if health.state(now) == "open":
+                    continue
+                if order == 0:
+                    # A one-off error on the primary only fails that call over; routing stays put
+                    ranked.append(((False, -1.0, order), backend))
+                    continue
+                latency = health.latency
+                ranked.append(((latency is None, (latency or 0) * (health.inflight + 1), order), backend))
+        return [backend for _, backend in sorted(ranked, key=lambda item: item[0])]
+
+    def _acquire(self, backend, operation):
+        health = self.health[backend.name, operation]
+        with self._lock:
+            state = health.state(time.monotonic())
+            if state == "open" or (state == "half_open" and health.probing):
+                return False
+            health.probing = state == "half_open"
+            health.inflight += 1
+            health.stats["calls"] += 1
+            return True
+
+    def _release(self, backend, operation, elapsed, count, ok):
+        """Record a finished call; ok=None (the caller went away) leaves the health untouched"""
+        health = self.health[backend.name, operation]
+        with self._lock:
+            health.inflight -= 1
+            health.probing = False
+            if ok is None:
+                return
+            if elapsed is not None:
+                per_essay = elapsed / max(count, 1)
+                health.latency = per_essay if health.latency is None else (
+                    LATENCY_SMOOTHING * per_essay + (1 - LATENCY_SMOOTHING) * health.latency
+                )
+                if per_essay > self.slow_seconds:
+                    health.stats["slow"] += 1
+                    # A slow answer beats none: only count it if another backend can take over
+                    ok = not self._has_alternative(backend, operation)
+            if ok:
+                health.failures = 0
+                health.open_until = 0.0
+                return
+            if elapsed is None:
+                health.stats["errors"] += 1
+            health.failures += 1
+            if health.failures >= self.failure_threshold or health.open_until:
+                # Open the circuit, or re-open it after a failed probe
+                if not health.open_until or time.monotonic() >= health.open_until:
+                    health.stats["opened"] += 1
+                health.open_until = time.monotonic() + self.cooldown
+
+    def _has_alternative(self, backend, operation):
+        now = time.monotonic()
+        return any(other is not backend and self.health[other.name, operation].state(now) != "open"
+                   for other in self.backends)
+
+    def _call(self, operation, fn, count):
+        self.stats["requests"] += 1
+        errors = []
+        for backend in self._ranked(operation):
+            if not self._acquire(backend, operation):
+                continue
+            if errors:
+                self.stats["failovers"] += 1
+            started = time.perf_counter()
+            try:
+                result = fn(backend)
+            except Exception as e:
+                self._release(backend, operation, None, count, False)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._release(backend, operation, time.perf_counter() - started, count, True)
+            return backend.name, result
+        self.stats["unavailable"] += 1
+        raise EngineError("; ".join(errors) or "No healthy backend available")
+
+    def score(self, texts):
+        """Return (backend name, [(label, confidence, probabilities)]) from the best available backend"""
+        if not texts:
+            return self.primary, []
+        return self._call("score", lambda backend: backend.score(texts), len(texts))
+
+    def feedback_sections(self, text):
+        """Yield (backend name, index, text, ok) per section as each finishes.
+
+        Fails over to the next backend only until the first section has been yielded.
+        """
+        self.stats["requests"] += 1
+        errors = []
+        for backend in self._ranked("feedback"):
+            if not self._acquire(backend, "feedback"):
+                continue
+            if errors:
+                self.stats["failovers"] += 1
+            started = time.perf_counter()
+            yielded, outcome = False, None
+            try:
+                complete = True
+                for index, section, ok in backend.feedback_sections(text):
+                    yielded = True
+                    complete = complete and ok
+                    yield backend.name, index, section, ok
+                outcome = complete
+            except Exception as e:
+                outcome = False
+                if yielded:
+                    raise
+                errors.append(f"{backend.name}: {e}")
+                continue
+            finally:
+                elapsed = time.perf_counter() - started if outcome else None
+                self._release(backend, "feedback", elapsed, 1, outcome)
+            return
+        self.stats["unavailable"] += 1
+        raise EngineError("; ".join(errors) or "No healthy backend available")
+
+    def feedback(self, text):
+        """Return (backend name, sections, complete); complete is False if any section is a fallback message"""
+        name, sections, complete = self.primary, [None] * len(FEEDBACK_SECTIONS), True
+        for name, index, section, ok in self.feedback_sections(text):
+            sections[index] = section
+            complete = complete and ok
+        return name, sections, complete
+
+    def latencies(self, operation="score"):
+        """Smoothed per-essay latency of each measured backend, in seconds"""
+        with self._lock:
+            return {name: health.latency for (name, op), health in self.health.items()
+                    if op == operation and health.latency is not None}
+
+    def open_circuits(self, operation="score"):
+        """1 for each backend whose circuit for the operation is open"""
+        now = time.monotonic()
+        with self._lock:
+            return {name: int(health.state(now) == "open") for (name, op), health in self.health.items()
+                    if op == operation}
+
+    def summary(self):
+        now = time.monotonic()
+        with self._lock:
+            backends = {}
+            for (name, operation), health in self.health.items():
+                backends.setdefault(name, {})[operation] = {
+                    "state": health.state(now),
+                    "inflight": health.inflight,
+                    "latency_ms": None if health.latency is None else round(health.latency * 1000, 2),
+                    "consecutive_failures": health.failures,
+                    **health.stats,
+                }
+        return {"primary": self.primary, **self.stats, "backends": backends}
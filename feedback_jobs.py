@@ -0,0 +1,61 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# How long finished feedback is kept for clients to collect
+FEEDBACK_JOB_TTL = 15 * 60
+
+
+class FeedbackJobs:
+    """Runs feedback generation in the background so scores can be returned immediately"""
+
+    def __init__(self, generate_fn, max_workers=1, max_pending=64, ttl=FEEDBACK_JOB_TTL):
+        self.generate_fn = generate_fn
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="feedback")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return sum(1 for future, _ in self._jobs.values() if not future.done())
+
+    def submit(self, text):
+        """Start generating feedback for an essay and return the job id"""
+        self._purge()
+        if self.pending >= self.max_pending:
+            return None
+        job_id = uuid.uuid4().hex
+        future = self._executor.submit(self.generate_fn, text)
+        with self._lock:
+            self._jobs[job_id] = (future, time.time())
+        return job_id
+
+    def status(self, job_id):
+        """Return the job state and, once finished, its feedback; None for unknown jobs"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        future, _ = job
+        if not future.done():
+            return {"status": "pending", "feedback": None}
+        if future.cancelled():
+            # Dropped from the queue by shutdown() before it ran
+            return {"status": "cancelled", "feedback": None, "error": "Feedback generation was cancelled"}
+        if future.exception() is not None:
+            return {"status": "failed", "feedback": None, "error": str(future.exception())}
+        return {"status": "done", "feedback": future.result()}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, (future, created) in self._jobs.items() if future.done() and created < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+
+import metrics
+from startup import lazy_import
+
+# httpx is only imported once the first request is made
+httpx = lazy_import("httpx")
+
+# Hugging Face Inference API settings; HF_API_BASE can point at mock_hf_server.py for local testing
+HF_API_BASE = os.environ.get("HF_API_BASE", "https://api-inference.huggingface.co/models")
+HF_CALL_TIMEOUT = float(os.environ.get("HF_CALL_TIMEOUT", 8))
+HF_DEADLINE = float(os.environ.get("HF_DEADLINE", 9))
+HF_MAX_RETRIES = int(os.environ.get("HF_MAX_RETRIES", 3))
+HF_MAX_CONNECTIONS = int(os.environ.get("HF_MAX_CONNECTIONS", 10))
+
+# Backoff bounds in seconds
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 4.0
+
+
+class HFError(Exception):
+    """Raised when the Inference API returns no usable result within the retry budget or deadline"""
+
+
+class HFClient:
+    """Connection-pooled async client for the Hugging Face Inference API.
+
+    Every call runs against an absolute deadline: retries for "currently loading"
+    responses, rate limits and server errors use jittered exponential backoff, and
+    no attempt or sleep is allowed to run past the deadline.
+    """
+
+    def __init__(self, token, base_url=HF_API_BASE, call_timeout=HF_CALL_TIMEOUT,
+                 max_retries=HF_MAX_RETRIES, max_connections=HF_MAX_CONNECTIONS):
+        self.base_url = base_url.rstrip("/")
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self._client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {token}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.stats = {"requests": 0, "retries": 0, "loading": 0, "errors": 0, "backoff_seconds": 0.0}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def query(self, model, payload, deadline):
+        """POST a payload to a model, retrying until a result arrives or the deadline passes"""
+        url = f"{self.base_url}/{model}"
+        last_error = "no attempts made"
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.stats["retries"] += 1
+
+            self.stats["requests"] += 1
+            retry_after = None
+            try:
+                with metrics.stage("hf_request"):
+                    response = await self._client.post(url, json=payload, timeout=min(self.call_timeout, remaining))
+                    result = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                last_error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code == 200 and not (isinstance(result, dict) and "error" in result):
+                    return result
+                error = result.get("error", "") if isinstance(result, dict) else ""
+                last_error = f"HTTP {response.status_code}: {error or response.text[:200]}"
+                if "currently loading" in error:
+                    self.stats["loading"] += 1
+                    retry_after = result.get("estimated_time")
+                elif response.status_code != 429 and response.status_code < 500:
+                    # Client errors won't succeed on retry
+                    break
+
+            if attempt < self.max_retries:
+                await self._backoff(attempt, deadline, retry_after)
+
+        self.stats["errors"] += 1
+        raise HFError(f"{model}: {last_error}")
+
+    async def _backoff(self, attempt, deadline, retry_after=None):
+        # Full jitter, capped by the model's own loading estimate and the remaining deadline
+        ceiling = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        if retry_after:
+            ceiling = min(BACKOFF_MAX, float(retry_after))
+        delay = min(random.uniform(0, ceiling), max(0.0, deadline - time.monotonic()))
+        self.stats["backoff_seconds"] += delay
+        with metrics.stage("hf_backoff"):
+            await asyncio.sleep(delay)
+
+    async def classify(self, model, text, labels, deadline):
+        return await self.query(model, {"inputs": text, "parameters": {"candidate_labels": labels}}, deadline)
+
+    async def generate(self, model, prompt, deadline, max_length=150):
+        result = await self.query(model, {"inputs": prompt, "parameters": {"max_length": max_length}}, deadline)
+        if not (isinstance(result, list) and result and "generated_text" in result[0]):
+            raise HFError(f"{model}: unexpected generation response")
+        return result[0]["generated_text"]
+
+
+# A single background event loop keeps the pooled client alive across synchronous callers
+_loop = None
+_loop_lock = threading.Lock()
+_clients = {}
+
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="hf-client", daemon=True).start()
+        return _loop
+
+
+def get_client(token, base_url=None):
+    """Return the shared client for a token and base URL; it must only be used on the background loop"""
+    key = (token, base_url or HF_API_BASE)
+    with _loop_lock:
+        if key not in _clients:
+            _clients[key] = HFClient(token, key[1])
+        return _clients[key]
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared background loop and wait for its result"""
+    coro = metrics.bind_timings(metrics.current_timings(), coro)
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+_END = object()
+
+
+async def _pump(agen, put):
+    # Runs on the background loop, handing each item (or the error that ended the stream) to the consumer
+    try:
+        async for item in agen:
+            put(item)
+    except Exception as e:
+        put(e)
+    finally:
+        put(_END)
+
+
+def iter_sync(agen):
+    """Iterate an async generator on the shared background loop from synchronous code"""
+    items = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(_pump(agen, items.put), _get_loop())
+    try:
+        while (item := items.get()) is not _END:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        future.cancel()
+
+
+def deadline_in(seconds=HF_DEADLINE):
+    return time.monotonic() + seconds
@@ -0,0 +1,207 @@
+import argparse
+import os
+import time
+from itertools import islice
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from scoring import MODEL_PATH, MAX_LEN, DEVICE, load_model, predict_batch
+
+# Inference backends for the BERT scorer. Everything except "torch" runs on CPU.
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model-int8.onnx"
+ONNX_OPSET = 14
+
+
+class OnnxClassifier:
+    """ONNX Runtime session exposing the same call signature as BertForSequenceClassification"""
+
+    def __init__(self, onnx_path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = Path(onnx_path)
+        self.session = ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, **tokens):
+        feed = {name: tensor.cpu().numpy() for name, tensor in tokens.items() if name in self.input_names}
+        logits = self.session.run(["logits"], feed)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def eval(self):
+        return self
+
+
+def quantize_int8(model):
+    """Dynamically quantize the Linear layers of a torch model to INT8"""
+    return torch.ao.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(model, tokenizer, onnx_path, max_length=MAX_LEN):
+    """Export the classifier to ONNX with dynamic batch and sequence axes"""
+    sample = tokenizer(["export sample"], return_tensors="pt", padding="max_length", max_length=max_length)
+    inputs = (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"])
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ("input_ids", "attention_mask", "token_type_ids")}
+    dynamic_axes["logits"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model.cpu(),
+            inputs,
+            str(onnx_path),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+        )
+
+
+def _is_stale(path, source):
+    return not path.exists() or (source.exists() and path.stat().st_mtime < source.stat().st_mtime)
+
+
+def _replace_with(path, write):
+    """Call write(tmp_path) with a per-process temporary file, then atomically move it to path"""
+    tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.tmp{path.suffix}")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def ensure_onnx(model_path=MODEL_PATH, quantized=False):
+    """Export (and optionally quantize) the ONNX model next to the weights if it is missing or stale"""
+    from artifacts import file_lock
+
+    model_dir = Path(model_path)
+    weights = model_dir / "model.safetensors"
+    onnx_path = model_dir / ONNX_FILE
+    int8_path = model_dir / ONNX_INT8_FILE
+    # Workers starting together export once; the others wait and then find the files up to date.
+    # Files only ever appear complete, so a session never opens a half-written export.
+    with file_lock(model_dir / ".onnx.lock"):
+        if _is_stale(onnx_path, weights):
+            tokenizer, model = load_model(model_path, torch.device("cpu"))
+            _replace_with(onnx_path, lambda tmp_path: export_onnx(model, tokenizer, tmp_path))
+        if not quantized:
+            return onnx_path
+
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        if _is_stale(int8_path, onnx_path):
+            _replace_with(int8_path, lambda tmp_path: quantize_dynamic(
+                str(onnx_path), str(tmp_path), weight_type=QuantType.QInt8
+            ))
+    return int8_path
+
+
+def backend_device(backend, device=DEVICE):
+    """Device that inputs for the given backend must be placed on"""
+    return device if backend == "torch" else torch.device("cpu")
+
+
+def load_backend(backend="torch", model_path=MODEL_PATH, device=DEVICE, mmap=False):
+    """Return (tokenizer, model) for the requested inference backend.
+
+    With mmap=True the FP32 torch weights are memory-mapped from model.safetensors
+    instead of copied, so processes on one host share them (CPU only).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    if backend == "torch":
+        if mmap and device.type == "cpu":
+            from memshare import load_model_mmap
+            return load_model_mmap(model_path)
+        return load_model(model_path, device)
+
+    tokenizer, model = load_model(model_path, torch.device("cpu"))
+    if backend == "int8":
+        return tokenizer, quantize_int8(model)
+    del model
+    return tokenizer, OnnxClassifier(ensure_onnx(model_path, quantized=backend == "onnx-int8"))
+
+
+def model_bytes(model):
+    """Approximate size of the model weights in bytes"""
+    if isinstance(model, OnnxClassifier):
+        return model.path.stat().st_size
+    total = 0
+    for value in model.state_dict().values():
+        # Quantized Linear layers store packed (weight, bias) tuples
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if torch.is_tensor(tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _timed_predict(texts, tokenizer, model, batch_size, max_length):
+    started = time.perf_counter()
+    results = []
+    for i in range(0, len(texts), batch_size):
+        results.extend(predict_batch(
+            texts[i:i + batch_size], tokenizer, model, device=torch.device("cpu"),
+            max_length=max_length, batch_size=batch_size,
+        ))
+    return results, time.perf_counter() - started
+
+
+def check_parity(texts, backend, model_path=MODEL_PATH, batch_size=8, max_length=MAX_LEN):
+    """Compare a backend against the FP32 torch model on a held-out set of essays"""
+    tokenizer, reference = load_model(model_path, torch.device("cpu"))
+    _, candidate = load_backend(backend, model_path, torch.device("cpu"))
+
+    expected, reference_seconds = _timed_predict(texts, tokenizer, reference, batch_size, max_length)
+    actual, candidate_seconds = _timed_predict(texts, tokenizer, candidate, batch_size, max_length)
+
+    agreement = np.mean([e[0] == a[0] for e, a in zip(expected, actual)])
+    drift = np.stack([np.abs(e[2] - a[2]) for e, a in zip(expected, actual)])
+    return {
+        "backend": backend,
+        "essays": len(texts),
+        "label_agreement": float(agreement),
+        "max_probability_drift": float(drift.max()),
+        "mean_probability_drift": float(drift.mean()),
+        "fp32_ms_per_essay": 1000 * reference_seconds / len(texts),
+        "backend_ms_per_essay": 1000 * candidate_seconds / len(texts),
+        "speedup": reference_seconds / candidate_seconds,
+        "fp32_model_mb": model_bytes(reference) / 2**20,
+        "backend_model_mb": model_bytes(candidate) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check an inference backend against the FP32 BERT scorer")
+    parser.add_argument("--backend", choices=BACKENDS[1:], default="int8",
+                        help="Backend to compare against FP32 torch (default: int8)")
+    parser.add_argument("--essays", required=True,
+                        help="CSV or JSONL file of held-out essays")
+    parser.add_argument("--text-field", default="text",
+                        help="Column or key holding the essay text (default: text)")
+    parser.add_argument("--limit", type=int, default=200,
+                        help="Number of essays to compare (default: 200)")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="Essays per forward pass (default: 8)")
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="Exit non-zero if label agreement falls below this (default: 0.99)")
+    args = parser.parse_args()
+
+    from bulk import read_essays
+
+    texts = [text for _, text in islice(read_essays(args.essays, args.text_field), args.limit)]
+    report = check_parity(texts, args.backend, batch_size=args.batch_size)
+    for name, value in report.items():
+        print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+    if report["label_agreement"] < args.min_agreement:
+        raise SystemExit(f"Label agreement {report['label_agreement']:.2%} is below {args.min_agreement:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Job queue settings, overridable through the environment
+JOBS_DB = os.environ.get("JOBS_DB", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+JOB_CHUNK_SIZE = int(os.environ.get("JOB_CHUNK_SIZE", 32))
+JOB_MAX_ESSAYS = int(os.environ.get("JOB_MAX_ESSAYS", 5000))
+# Claimed work not finished within the lease (e.g. the process died) is picked up again
+JOB_LEASE_SECONDS = 600
+JOB_POLL_SECONDS = 1.0
+# Essays whose scoring hit a transient error (e.g. no healthy backend) are retried after this delay
+JOB_RETRY_SECONDS = float(os.environ.get("JOB_RETRY_SECONDS", 30))
+# Upper bound of the backoff between attempts to load the models before a worker starts
+JOB_READY_BACKOFF_MAX = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    total INTEGER NOT NULL,
+    feedback INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    essay_id TEXT,
+    text TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    score INTEGER,
+    confidence REAL,
+    feedback TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS items_by_stage ON items (stage, claimed_until);
+"""
+
+
+class JobStore:
+    """SQLite-backed job state, safe to share between threads and worker processes.
+
+    Each essay moves through the stages "score" -> "feedback" (if requested) ->
+    "done", or ends in "failed". Workers claim a chunk of essays in one stage
+    under a lease, so work held by a process that died is picked up again.
+    """
+
+    def __init__(self, db_path=JOBS_DB):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def create(self, essays, feedback=False):
+        """Store a job of [(essay_id, text)] and return its id"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("INSERT INTO jobs VALUES (?, ?, ?, ?)", (job_id, time.time(), len(essays), int(feedback)))
+            self._db.executemany(
+                "INSERT INTO items (job_id, position, essay_id, text, stage) VALUES (?, ?, ?, ?, 'score')",
+                [(job_id, position, essay_id, text) for position, (essay_id, text) in enumerate(essays)],
+            )
+            self._db.execute("COMMIT")
+        return job_id
+
+    def claim(self, stage, limit, lease=JOB_LEASE_SECONDS):
+        """Lease up to `limit` essays waiting in a stage, oldest job first; returns [(job_id, position, text)]"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            rows = self._db.execute(
+                "SELECT items.job_id, position, text FROM items JOIN jobs ON jobs.id = items.job_id "
+                "WHERE stage = ? AND claimed_until < ? ORDER BY jobs.created, position LIMIT ?",
+                (stage, now, limit),
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE items SET claimed_until = ? WHERE job_id = ? AND position = ?",
+                [(now + lease, job_id, position) for job_id, position, _ in rows],
+            )
+            self._db.execute("COMMIT")
+        return rows
+
+    def save_scores(self, items, results):
+        """Record scores for claimed essays and move them on to feedback or done"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany(
+                "UPDATE items SET score = ?, confidence = ?, claimed_until = 0, "
+                "stage = CASE WHEN (SELECT feedback FROM jobs WHERE id = job_id) THEN 'feedback' ELSE 'done' END "
+                "WHERE job_id = ? AND position = ?",
+                [(label, confidence, job_id, position) for (job_id, position, _), (label, confidence, _) in zip(items, results)],
+            )
+            self._db.execute("COMMIT")
+
+    def save_feedback(self, job_id, position, feedback):
+        with self._lock:
+            self._db.execute(
+                "UPDATE items SET feedback = ?, stage = 'done', claimed_until = 0 WHERE job_id = ? AND position = ?",
+                (json.dumps(feedback), job_id, position),
+            )
+
+    def retry(self, items, delay=JOB_RETRY_SECONDS):
+        """Give claimed essays back to their stage, to be claimed again after `delay` seconds"""
+        with self._lock:
+            self._db.executemany(
+                "UPDATE items SET claimed_until = ? WHERE job_id = ? AND position = ?",
+                [(time.time() + delay, job_id, position) for job_id, position, _ in items],
+            )
+
+    def fail(self, items, error):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE items SET stage = 'failed', error = ?, claimed_until = 0 WHERE job_id = ? AND position = ?",
+                [(error, job_id, position) for job_id, position, _ in items],
+            )
+
+    def status(self, job_id, offset=0, limit=100):
+        """Progress counts plus one page of results in submission order; None for unknown jobs"""
+        with self._lock:
+            job = self._db.execute("SELECT created, total, feedback FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._db.execute(
+                "SELECT stage, COUNT(*) FROM items WHERE job_id = ? GROUP BY stage", (job_id,)
+            ).fetchall())
+            # Essays that failed at the feedback stage still have their score
+            scored = self._db.execute(
+                "SELECT COUNT(*) FROM items WHERE job_id = ? AND score IS NOT NULL", (job_id,)
+            ).fetchone()[0]
+            rows = self._db.execute(
+                "SELECT position, essay_id, stage, score, confidence, feedback, error FROM items "
+                "WHERE job_id = ? ORDER BY position LIMIT ? OFFSET ?", (job_id, limit, offset),
+            ).fetchall()
+
+        created, total, feedback = job
+        finished = counts.get("done", 0) + counts.get("failed", 0)
+        if finished == total:
+            state = "done"
+        elif counts.get("score", 0) == total:
+            state = "queued"
+        else:
+            state = "running"
+        results = [
+            {"position": position, "id": essay_id, "status": stage, "score": score, "confidence": confidence,
+             "feedback": json.loads(feedback) if feedback else None, "error": error}
+            for position, essay_id, stage, score, confidence, feedback, error in rows
+        ]
+        return {
+            "job_id": job_id,
+            "status": state,
+            "total": total,
+            "scored": scored,
+            "feedback_pending": counts.get("feedback", 0) if feedback else None,
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "results": results,
+            "next_offset": offset + len(results) if offset + len(results) < total else None,
+        }
+
+    def pending(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM items WHERE stage IN ('score', 'feedback')").fetchone()[0]
+
+
+class JobWorkers:
+    """Background threads that drain stored jobs through the batched scoring and feedback functions.
+
+    Scoring is preferred over feedback so every job's scores arrive before the
+    slower feedback generation starts eating into worker time. Scoring errors of
+    the types in retry_errors are treated as transient and the chunk is retried.
+    """
+
+    def __init__(self, store, score_fn, feedback_fn, workers=JOB_WORKERS, chunk_size=JOB_CHUNK_SIZE,
+                 ready_fn=None, retry_errors=()):
+        self.store = store
+        self.score_fn = score_fn
+        self.feedback_fn = feedback_fn
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.ready_fn = ready_fn
+        self.retry_errors = tuple(retry_errors)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def _wait_ready(self):
+        # Jobs stay queued while the models are unavailable, for this worker's next attempt or another process
+        delay = JOB_POLL_SECONDS
+        while not self._stop.is_set():
+            try:
+                self.ready_fn()
+                return True
+            except Exception as e:
+                print(f"Job worker waiting for models ({e}); retrying in {delay:g}s")
+            self._stop.wait(delay)
+            delay = min(delay * 2, JOB_READY_BACKOFF_MAX)
+        return False
+
+    def _run(self):
+        if self.ready_fn is not None and not self._wait_ready():
+            return
+        while not self._stop.is_set():
+            if not self._work_once():
+                self._stop.wait(JOB_POLL_SECONDS)
+
+    def _work_once(self):
+        items = self.store.claim("score", self.chunk_size)
+        if items:
+            try:
+                results = self.score_fn([text for _, _, text in items])
+            except self.retry_errors as e:
+                print(f"Job scoring unavailable, retrying in {JOB_RETRY_SECONDS:.0f}s: {e}")
+                self.store.retry(items)
+                return False
+            except Exception as e:
+                self.store.fail(items, str(e))
+            else:
+                self.store.save_scores(items, results)
+            return True
+
+        items = self.store.claim("feedback", 1)
+        for job_id, position, text in items:
+            try:
+                self.store.save_feedback(job_id, position, self.feedback_fn(text))
+            except Exception as e:
+                self.store.fail([(job_id, position, text)], str(e))
+        return bool(items)
@@ -0,0 +1,109 @@
+import json
+import mmap
+import os
+import struct
+import warnings
+from pathlib import Path
+
+import torch
+
+from scoring import MODEL_PATH
+from tokenization import load_tokenizer
+
+# safetensors dtype codes
+_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def load_safetensors_mmap(path):
+    """Map a .safetensors file read-only and return tensors that point straight into the mapping.
+
+    Nothing is copied: the weights live in the OS page cache, so every process that
+    maps the same file (forked or not) shares one physical copy.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    data_start = 8 + header_size
+    tensors = {}
+    with warnings.catch_warnings():
+        # The mapping is read-only on purpose; inference never writes to the weights
+        warnings.filterwarnings("ignore", message=".*not writable.*")
+        for name, info in header.items():
+            if name == "__metadata__":
+                continue
+            dtype = _DTYPES[info["dtype"]]
+            start, end = info["data_offsets"]
+            count = (end - start) // torch.empty((), dtype=dtype).element_size()
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + start)
+            tensors[name] = tensor.reshape(info["shape"])
+    return tensors
+
+
+def warm_page_cache(path, block_size=16 * 1024 * 1024):
+    """Read a file once so its pages are in the OS page cache before processes map it"""
+    if not os.path.exists(path):
+        return 0
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        while block := f.read(block_size):
+            total += len(block)
+    return total
+
+
+def load_model_mmap(model_path=MODEL_PATH):
+    """Build BertForSequenceClassification whose parameters are backed by the mmapped weights"""
+    from transformers import BertConfig, BertForSequenceClassification
+    from transformers.modeling_utils import no_init_weights
+
+    config = BertConfig.from_pretrained(model_path)
+    # Skip random initialization: the parameters are replaced by mmapped tensors right away
+    with no_init_weights():
+        model = BertForSequenceClassification(config)
+
+    state = load_safetensors_mmap(Path(model_path) / "model.safetensors")
+    result = model.load_state_dict(state, strict=False, assign=True)
+    parameter_names = {name for name, _ in model.named_parameters()}
+    missing = [name for name in result.missing_keys if name in parameter_names]
+    if missing:
+        raise RuntimeError(f"Weights file is missing parameters: {', '.join(missing)}")
+
+    model.eval()
+    return load_tokenizer(model_path), model
+
+
+def memory_report(pid=None):
+    """Resident memory of a process split into pages shared with other processes and pages unique to it"""
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    if not os.path.exists(path):
+        return None
+
+    fields = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+
+    def mb(*names):
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+
+    return {
+        "pid": pid or os.getpid(),
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "unique_mb": mb("Private_Clean", "Private_Dirty"),
+    }
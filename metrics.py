@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Adds a Server-Timing header with the per-stage breakdown to API responses
+TIMING_HEADER = os.environ.get("TIMING_HEADER", "False").lower() == "true"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric created in this process, rendered in order by render()
+_registry = []
+
+# Per-request stage durations; None outside a request_timings() block
+_timings = ContextVar("timings", default=None)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets; observe() is a bisect and a few adds under a lock"""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(values, list(counts), total) for values, (counts, total) in self._series.items()]
+        for values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Last-set value, or a callback read at scrape time for values owned by other objects.
+
+    With a label name, the callback returns a dict and each key becomes one series.
+    """
+
+    def __init__(self, name, documentation, fn=None, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.label = label
+        self.value = 0
+        _registry.append(self)
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        value = self.fn() if self.fn is not None else self.value
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.label is None:
+            return lines + [f"{self.name} {value}"]
+        return lines + [f'{self.name}{{{self.label}="{key}"}} {item}' for key, item in (value or {}).items()]
+
+
+class StatsCounter:
+    """Exposes an existing stats dict (cache, client, batcher) as one labelled counter family.
+
+    Keys in `gauges` hold current values rather than running totals; they are left out
+    so they can be exported as gauges instead.
+    """
+
+    def __init__(self, name, documentation, fn, label="event", gauges=()):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.label = label
+        self.gauges = frozenset(gauges)
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in (self.fn() or {}).items():
+            if isinstance(value, (int, float)) and key not in self.gauges:
+                lines.append(f'{self.name}{{{self.label}="{key}"}} {value}')
+        return lines
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Hot-path stage latencies shared by the local and remote scorers
+STAGE_SECONDS = Histogram("essay_stage_seconds", "Time spent in each scoring and feedback stage", labels=("stage",))
+
+
+@contextmanager
+def stage(name):
+    """Time a block into the stage histogram and the current request's breakdown"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def record(name, elapsed, timings=None):
+    """Add an already measured duration, optionally to another request's breakdown"""
+    STAGE_SECONDS.observe(elapsed, name)
+    timings = timings if timings is not None else _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def request_timings():
+    """Collect the stage durations of the code run inside the block into a dict"""
+    timings = {}
+    token = _timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings["total"] = time.perf_counter() - started
+        _timings.reset(token)
+
+
+def current_timings():
+    return _timings.get()
+
+
+def bind_timings(timings, coro):
+    """Wrap a coroutine so its stages land in `timings` when it runs on another event loop"""
+    if timings is None:
+        return coro
+
+    async def run():
+        token = _timings.set(timings)
+        try:
+            return await coro
+        finally:
+            _timings.reset(token)
+    return run()
+
+
+def collect(fn, *args):
+    """Call fn with a fresh breakdown and return (result, timings); used for work shared by several requests"""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        return fn(*args), timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(timings):
+    """Format a breakdown as a Server-Timing header value, in milliseconds"""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
@@ -0,0 +1,157 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockHFHandler(BaseHTTPRequestHandler):
+    """Mimics the Hugging Face Inference API responses used by api/index.py"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_HEAD(self):
+        self._serve_file(send_body=False)
+
+    def do_GET(self):
+        self._serve_file(send_body=True)
+
+    def _serve_file(self, send_body):
+        # Static files under /files/ with byte-range support, standing in for model release downloads
+        root = self.server.files_dir
+        name = self.path.split("/files/", 1)[-1]
+        path = os.path.join(root, os.path.basename(name)) if root and self.path.startswith("/files/") else None
+        if path is None or not os.path.isfile(path):
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            first, _, last = range_header[len("bytes="):].partition("-")
+            start, end = int(first or 0), min(int(last) if last else size - 1, size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not send_body:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                # Optionally drop the connection part-way to exercise resume
+                if self.server.truncate_after and f.tell() - start >= self.server.truncate_after:
+                    self.close_connection = True
+                    return
+                block = f.read(min(64 * 1024, remaining))
+                self.wfile.write(block)
+                remaining -= len(block)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        model = self.path.split("/models/", 1)[-1].strip("/")
+        server = self.server
+
+        with server.lock:
+            server.requests += 1
+            loading = server.loading_remaining.get(model, server.loading)
+            server.loading_remaining[model] = max(0, loading - 1)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        # The first `loading` calls per model answer like a cold model
+        if loading > 0:
+            self._send_json(503, {"error": f"Model {model} is currently loading", "estimated_time": server.estimated_time})
+            return
+        if server.error_rate and random.random() < server.error_rate:
+            self._send_json(500, {"error": "Internal server error"})
+            return
+
+        inputs = body.get("inputs", "")
+        labels = body.get("parameters", {}).get("candidate_labels")
+        if labels:
+            # Deterministic pseudo-scores so the same essay always gets the same result
+            seed = int(hashlib.sha256(inputs.encode()).hexdigest(), 16)
+            weights = [((seed >> (8 * i)) & 0xFF) + 1 for i in range(len(labels))]
+            total = sum(weights)
+            ranked = sorted(zip(labels, (w / total for w in weights)), key=lambda pair: -pair[1])
+            self._send_json(200, {
+                "sequence": inputs,
+                "labels": [label for label, _ in ranked],
+                "scores": [score for _, score in ranked],
+            })
+        else:
+            words = inputs.split()
+            self._send_json(200, [{"generated_text": "Mock feedback: " + " ".join(words[:30])}])
+
+
+def start_mock_server(port=0, loading=0, latency=0.0, error_rate=0.0, estimated_time=0.5, verbose=False,
+                      files_dir=None, truncate_after=0):
+    """Start the stand-in server on a background thread and return (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHFHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.loading = loading
+    server.loading_remaining = {}
+    server.latency = latency
+    server.error_rate = error_rate
+    server.estimated_time = estimated_time
+    server.verbose = verbose
+    server.files_dir = files_dir
+    server.truncate_after = truncate_after
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/models"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Hugging Face Inference API")
+    parser.add_argument("--port", type=int, default=8090,
+                        help="Port to listen on (default: 8090)")
+    parser.add_argument("--loading", type=int, default=0,
+                        help="Answer the first N calls per model with 'currently loading' (default: 0)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds of artificial latency per call (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of calls that fail with HTTP 500 (default: 0)")
+    parser.add_argument("--files", default=None,
+                        help="Directory served under /files/ with range support, for artifact downloads")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(args.port, args.loading, args.latency, args.error_rate, verbose=True,
+                                         files_dir=args.files)
+    print(f"Mock Hugging Face API listening on {base_url} - set HF_API_BASE to use it")
+    if args.files:
+        print(f"Serving files from {args.files} at {base_url.rsplit('/models', 1)[0]}/files/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Models are loaded on first use and the least recently used idle ones are evicted to stay under the budget
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", 0)) or None
+# Models unused for this long are evicted even when the budget is not reached (0 keeps them)
+MODEL_IDLE_SECONDS = float(os.environ.get("MODEL_IDLE_SECONDS", 600))
+# "bfloat16" halves the resident size of the torch models on CPU, at a small accuracy cost
+MODEL_DTYPE = os.environ.get("MODEL_DTYPE", "float32")
+MODEL_EVENT_HISTORY = 100
+
+
+def tensor_bytes(model):
+    """Bytes held by a torch module's parameters and buffers"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def reduced_precision(model, dtype=MODEL_DTYPE):
+    """Cast a CPU torch model's weights to bfloat16 if configured, otherwise return it unchanged"""
+    import torch
+
+    if dtype != "bfloat16" or not isinstance(model, torch.nn.Module):
+        return model
+    if any(parameter.device.type != "cpu" for parameter in model.parameters()):
+        return model
+    return model.to(torch.bfloat16)
+
+
+class _Entry:
+    def __init__(self, name, loader, size_fn, pinned=False):
+        self.name = name
+        self.loader = loader
+        self.size_fn = size_fn
+        self.pinned = pinned
+        self.value = None
+        self.resident = False
+        self.bytes = None
+        self.users = 0
+        self.loads = 0
+        self.last_used = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Lazily loaded models under a memory budget, shared by the Streamlit app and the API.
+
+    Models are registered with a loader and loaded on first use. Before a model is
+    loaded, and again once its real size is known, the least recently used models
+    that nobody is using are evicted until the resident total fits the budget.
+    Models idle for longer than idle_seconds are evicted by evict_idle(), which the
+    reaper thread calls periodically. A model in use is never evicted, so the
+    budget can be exceeded while requests hold several large models at once.
+    Pinned models are loaded lazily too but only ever evicted explicitly.
+    """
+
+    def __init__(self, budget_mb=MODEL_MEMORY_BUDGET_MB, idle_seconds=MODEL_IDLE_SECONDS):
+        self.budget = int(budget_mb * 2**20) if budget_mb else None
+        self.idle_seconds = idle_seconds
+        self.events = deque(maxlen=MODEL_EVENT_HISTORY)
+        self.stats = {"loads": 0, "evictions": 0, "hits": 0, "load_errors": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def register(self, name, loader, size_fn=tensor_bytes, pinned=False):
+        """Add a model; loader() builds it and size_fn(value) measures its resident bytes"""
+        with self._lock:
+            self._entries[name] = _Entry(name, loader, size_fn, pinned)
+
+    @contextmanager
+    def use(self, name):
+        """Yield the model, loading it first if needed; it cannot be evicted inside the block"""
+        entry = self._entries[name]
+        with self._lock:
+            entry.users += 1
+        try:
+            yield self._ensure_loaded(entry)
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.time()
+                self._entries.move_to_end(name)
+
+    def get(self, name):
+        """Load the model if needed and return it, for callers that keep no reference for long"""
+        with self.use(name) as value:
+            return value
+
+    def peek(self, name):
+        """The model if it is resident, without loading it or counting as a use"""
+        entry = self._entries.get(name)
+        return entry.value if entry is not None and entry.resident else None
+
+    def _ensure_loaded(self, entry):
+        with entry.lock:
+            if entry.resident:
+                self.stats["hits"] += 1
+                return entry.value
+            # Make room using the size measured the last time this model was loaded
+            if entry.bytes:
+                self._fit(entry.bytes, keep=entry.name)
+            started = time.perf_counter()
+            try:
+                value = entry.loader()
+            except Exception as e:
+                self.stats["load_errors"] += 1
+                self._event("load_error", entry.name, error=str(e))
+                raise
+            entry.load_seconds = round(time.perf_counter() - started, 3)
+            entry.bytes = entry.size_fn(value) if value is not None else 0
+            with self._lock:
+                entry.value, entry.resident = value, True
+                entry.loads += 1
+                entry.last_used = time.time()
+                self._entries.move_to_end(entry.name)
+            self.stats["loads"] += 1
+            self._event("load", entry.name, bytes=entry.bytes, seconds=entry.load_seconds)
+            self._fit(0, keep=entry.name)
+            return value
+
+    def _resident_bytes(self):
+        return sum(entry.bytes or 0 for entry in self._entries.values() if entry.resident)
+
+    def _fit(self, incoming, keep):
+        if self.budget is None:
+            return
+        with self._lock:
+            candidates = [entry for entry in self._entries.values()
+                          if entry.resident and entry.users == 0 and not entry.pinned and entry.name != keep]
+        # Oldest first: the entries are kept in least recently used order
+        for entry in candidates:
+            if self._resident_bytes() + incoming <= self.budget:
+                break
+            self.evict(entry.name, reason="budget")
+        if self._resident_bytes() + incoming > self.budget:
+            self._event("over_budget", keep, bytes=self._resident_bytes() + incoming)
+
+    def evict(self, name, reason="manual"):
+        """Drop a resident model unless it is in use; returns whether it was evicted"""
+        entry = self._entries[name]
+        with self._lock:
+            if not entry.resident or entry.users:
+                return False
+            entry.value, entry.resident = None, False
+        self.stats["evictions"] += 1
+        self._event("evict", name, bytes=entry.bytes, reason=reason)
+        gc.collect()
+        return True
+
+    def evict_idle(self, now=None):
+        """Evict models unused for longer than idle_seconds"""
+        if not self.idle_seconds:
+            return []
+        now = now or time.time()
+        with self._lock:
+            idle = [entry.name for entry in self._entries.values()
+                    if entry.resident and entry.users == 0 and not entry.pinned
+                    and now - entry.last_used > self.idle_seconds]
+        return [name for name in idle if self.evict(name, reason="idle")]
+
+    def start_reaper(self, interval=None):
+        """Check for idle models on a background thread; no-op while one is running"""
+        # A reaper started before a fork does not exist in the child, so check it is alive
+        if (self._reaper is not None and self._reaper.is_alive()) or not self.idle_seconds:
+            return
+        interval = interval or max(self.idle_seconds / 4, 1)
+
+        def run():
+            while not self._stop.wait(interval):
+                self.evict_idle()
+        self._reaper = threading.Thread(target=run, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _event(self, event, name, **details):
+        self.events.append({"time": round(time.time(), 3), "event": event, "model": name, **details})
+        print(f"Model registry: {event} {name} {details}")
+
+    def resident_bytes(self):
+        """Resident bytes of each loaded model, for the metrics endpoint"""
+        with self._lock:
+            return {entry.name: entry.bytes or 0 for entry in self._entries.values() if entry.resident}
+
+    def summary(self):
+        with self._lock:
+            models = {
+                entry.name: {
+                    "resident": entry.resident,
+                    "pinned": entry.pinned,
+                    "mb": round(entry.bytes / 2**20, 1) if entry.bytes is not None else None,
+                    "in_use": entry.users,
+                    "loads": entry.loads,
+                    "load_seconds": entry.load_seconds,
+                    "idle_seconds": round(time.time() - entry.last_used, 1) if entry.last_used else None,
+                }
+                for entry in self._entries.values()
+            }
+            resident = self._resident_bytes()
+        return {
+            "budget_mb": round(self.budget / 2**20, 1) if self.budget else None,
+            "resident_mb": round(resident / 2**20, 1),
+            "dtype": MODEL_DTYPE,
+            "models": models,
+            **self.stats,
+            "events": list(self.events),
+        }
@@ -2,17 +2,101 @@ import os
 import argparse
 import subprocess
 
+# Seconds between per-worker memory reports in multi-worker API mode
+MEMORY_REPORT_INTERVAL = 60
+
+def _api_worker(port, sock, num_threads):
+    import torch
+    # The app (result cache, job store, similarity index, model registry) is only created after the fork,
+    # so no SQLite connection, memmap or background thread is ever shared between processes
+    import app
+    torch.set_num_threads(num_threads)
+    app.serve_api(port, sock)
+
+def run_api_workers(port, workers):
+    """Serve the API from several forked workers sharing one listening socket and one copy of the weights"""
+    import socket
+    import time
+    from multiprocessing import cpu_count, get_context
+    from pathlib import Path
+    from autotune import load_tuning
+    from memshare import memory_report, warm_page_cache
+    from scoring import MODEL_PATH
+    
+    # Only the weights are shared: each worker memory-maps the same file, so the pages read here are
+    # used by all of them. Models, caches and stores are loaded by each worker once it has started.
+    warmed = warm_page_cache(Path(MODEL_PATH) / "model.safetensors")
+    print(f"Weights in page cache ({warmed / 2 ** 20:.0f} MB): {memory_report()}")
+    
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", port))
+    sock.listen(2048)
+    
+    tuning = load_tuning()
+    num_threads = tuning["intra_op_threads"] if tuning else max(1, cpu_count() // workers)
+    context = get_context("fork")
+    processes = [context.Process(target=_api_worker, args=(port, sock, num_threads)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    
+    try:
+        while all(process.is_alive() for process in processes):
+            time.sleep(MEMORY_REPORT_INTERVAL)
+            for process in processes:
+                report = memory_report(process.pid)
+                if report:
+                    print(f"Worker {process.pid}: unique {report['unique_mb']} MB, "
+                          f"shared {report['shared_mb']} MB, rss {report['rss_mb']} MB", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
 def main():
     parser = argparse.ArgumentParser(description="Run Essay Scoring App in Streamlit or API mode")
-    parser.add_argument("--mode", choices=["streamlit", "api", "both"], default="streamlit", 
-                        help="Run in Streamlit mode, API mode, or both")
+    parser.add_argument("--mode", choices=["streamlit", "api", "both", "batch"], default="streamlit", 
+                        help="Run in Streamlit mode, API mode, both, or score a file of essays in batch mode")
     parser.add_argument("--port", type=int, default=8000,
                         help="Port for the API server (default: 8000)")
     parser.add_argument("--streamlit-port", type=int, default=8501,
                         help="Port for Streamlit (default: 8501)")
     
+    # Batch mode options
+    parser.add_argument("--input", help="CSV or JSONL file of essays to score (batch mode)")
+    parser.add_argument("--output", help="JSONL file to write scores to (batch mode)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes for API and batch modes (default: from tuning.json, else 1)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Essays per forward pass in batch mode (default: from tuning.json, else 32)")
+    parser.add_argument("--sort-window", type=int, default=8,
+                        help="Batches read ahead and sorted by length before padding (default: 8)")
+    parser.add_argument("--long-doc", action="store_true",
+                        help="Score whole essays in overlapping windows instead of truncating")
+    parser.add_argument("--window-strategy", choices=["mean", "max", "length"], default="mean",
+                        help="How window probabilities are combined in --long-doc mode (default: mean)")
+    parser.add_argument("--backend", choices=["torch", "int8", "onnx", "onnx-int8"], default="torch",
+                        help="Inference backend for batch mode (default: torch)")
+    parser.add_argument("--text-field", default="text",
+                        help="Column or key holding the essay text (default: text)")
+    parser.add_argument("--id-field", default="id",
+                        help="Column or key holding the essay id (default: id)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore any checkpoint and rescore from the start")
+    
     args = parser.parse_args()
     
+    # Settings chosen by `python autotune.py` fill in anything not given on the command line
+    from autotune import load_tuning
+    tuning = load_tuning() or {}
+    if args.workers is None:
+        args.workers = tuning.get("workers", 1)
+    if args.batch_size is None:
+        args.batch_size = tuning.get("batch_size", 32)
+    
     if args.mode == "streamlit":
         # Run Streamlit only
         cmd = f"streamlit run app.py --server.port={args.streamlit_port}"
@@ -22,7 +106,11 @@ def main():
         # Run only the API server
         os.environ["ENABLE_API"] = "True"
         os.environ["PORT"] = str(args.port)
-        import app
+        if args.workers > 1:
+            run_api_workers(args.port, args.workers)
+        else:
+            import app
+            app.serve_api(args.port)
         
     elif args.mode == "both":
         # Run both Streamlit and API
@@ -33,6 +121,7 @@ def main():
         from multiprocessing import Process
         def run_api():
             import app
+            app.serve_api(args.port)
         
         api_process = Process(target=run_api)
         api_process.start()
@@ -44,6 +133,27 @@ def main():
         # Clean up API process when Streamlit exits
         api_process.terminate()
         api_process.join()
+    
+    elif args.mode == "batch":
+        # Score a file of essays offline
+        if not args.input or not args.output:
+            parser.error("--mode batch requires --input and --output")
+        from bulk import run_batch
+        total = run_batch(
+            args.input,
+            args.output,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            text_field=args.text_field,
+            id_field=args.id_field,
+            resume=not args.no_resume,
+            sort_window=args.sort_window,
+            long_doc=args.long_doc,
+            window_strategy=args.window_strategy,
+            backend=args.backend,
+            num_threads=tuning.get("intra_op_threads"),
+        )
+        print(f"Finished scoring {total} essays into {args.output}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
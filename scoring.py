@@ -0,0 +1,165 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import BertForSequenceClassification
+
+from bucketing import bucket_batches
+from metrics import stage
+from tokenization import load_tokenizer
+
+# Constants
+MODEL_PATH = "bert_multiclass_model"
+MAX_LEN = 256
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Long-document mode: overlapping windows up to the model's 512 positions
+WINDOW_SIZE = 512
+WINDOW_OVERLAP = 64
+WINDOW_STRATEGIES = ("mean", "max", "length")
+# Windows scored per essay; the rest of a longer essay is ignored, so one request can't grow without bound
+MAX_WINDOWS = 16
+
+# Load model and tokenizer from a local directory
+def load_model(model_path=MODEL_PATH, device=DEVICE):
+    tokenizer = load_tokenizer(model_path)
+    model = BertForSequenceClassification.from_pretrained(model_path)
+    model.to(device)
+    model.eval()
+    return tokenizer, model
+
+# Tokenize without padding so batches can be formed by length afterwards
+def encode(texts, tokenizer, max_length=MAX_LEN):
+    return tokenizer(list(texts), truncation=True, max_length=max_length)["input_ids"]
+
+# Pad a list of token id sequences into model inputs
+def collate(sequences, pad_token_id=0, device=DEVICE):
+    width = max(len(ids) for ids in sequences)
+    input_ids = torch.full((len(sequences), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+    for row, ids in enumerate(sequences):
+        input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+    return {
+        "input_ids": input_ids.to(device),
+        "attention_mask": attention_mask.to(device),
+        "token_type_ids": torch.zeros_like(input_ids).to(device),
+    }
+
+# Run pre-tokenized sequences through the model, one forward pass per length bucket
+def predict_sequences(sequences, model, device=DEVICE, batch_size=None, pad_token_id=0, stats=None, batches=None):
+    """Return a (len(sequences), num_labels) array of probabilities in input order.
+
+    `batches` (lists of sequence indices) overrides the length bucketing for callers that
+    need certain sequences to share a forward pass.
+    """
+    lengths = [len(ids) for ids in sequences]
+    batch_size = batch_size or len(sequences)
+    if batches is None:
+        batches = bucket_batches(lengths, batch_size)
+    if stats is not None:
+        stats.record(lengths, batches, batch_size)
+
+    probabilities = [None] * len(sequences)
+    with torch.inference_mode():
+        for batch in batches:
+            with stage("collate"):
+                tokens = collate([sequences[i] for i in batch], pad_token_id, device)
+            with stage("forward"):
+                output = model(**tokens)
+            with stage("softmax"):
+                batch_probs = F.softmax(output.logits.float(), dim=1).cpu().numpy()
+            for i, probs in zip(batch, batch_probs):
+                probabilities[i] = probs
+    return probabilities
+
+# Run a batch of essays through the classifier
+def predict_batch(texts, tokenizer, model, device=DEVICE, max_length=MAX_LEN, batch_size=None, stats=None):
+    """Score a list of essays, returning (label, confidence, probabilities) per essay"""
+    if not texts:
+        return []
+
+    with stage("tokenize"):
+        sequences = encode(texts, tokenizer, max_length)
+    probabilities = predict_sequences(
+        sequences, model, device, batch_size=batch_size, pad_token_id=tokenizer.pad_token_id, stats=stats
+    )
+
+    results = []
+    for probs in probabilities:
+        label = int(probs.argmax())
+        results.append((label, float(probs[label]), probs))
+    return results
+
+# Split a token id sequence (without special tokens) into overlapping windows
+def split_windows(ids, cls_token_id, sep_token_id, window_size=WINDOW_SIZE, overlap=WINDOW_OVERLAP):
+    content = window_size - 2
+    if overlap >= content:
+        raise ValueError(f"Window overlap ({overlap}) must be smaller than the window content ({content})")
+    step = content - overlap
+    starts = list(range(0, max(len(ids) - overlap, 1), step))
+    return [[cls_token_id] + ids[start:start + content] + [sep_token_id] for start in starts]
+
+# Combine per-window probabilities into one distribution for the essay
+def aggregate_windows(window_probs, window_lengths, strategy="mean"):
+    window_probs = np.stack(window_probs)
+    if strategy == "mean":
+        return window_probs.mean(axis=0)
+    if strategy == "max":
+        pooled = window_probs.max(axis=0)
+        return pooled / pooled.sum()
+    if strategy == "length":
+        weights = np.asarray(window_lengths, dtype=window_probs.dtype)
+        return (window_probs * weights[:, None]).sum(axis=0) / weights.sum()
+    raise ValueError(f"Unknown window strategy '{strategy}', expected one of {WINDOW_STRATEGIES}")
+
+# Keep each essay's windows together, packing whole essays into batches of up to batch_size windows
+def essay_batches(owners, batch_size=None):
+    groups = []
+    for index, owner in enumerate(owners):
+        if not groups or owners[groups[-1][-1]] != owner:
+            groups.append([])
+        groups[-1].append(index)
+    if not batch_size:
+        return groups
+
+    batches = []
+    for group in groups:
+        if batches and len(batches[-1]) + len(group) <= batch_size:
+            batches[-1].extend(group)
+            continue
+        # An essay with more windows than batch_size is forwarded in chunks, bounding the batch memory
+        batches.extend(group[start:start + batch_size] for start in range(0, len(group), batch_size))
+    return batches
+
+# Score long essays in windows, each essay's windows kept together in as few forward passes as batch_size allows
+def predict_long(texts, tokenizer, model, device=DEVICE, window_size=WINDOW_SIZE, overlap=WINDOW_OVERLAP,
+                 strategy="mean", batch_size=None, stats=None, max_windows=MAX_WINDOWS):
+    """Score essays up to max_windows windows long, returning (label, confidence, probabilities) per essay"""
+    if not texts:
+        return []
+
+    with stage("tokenize"):
+        encoded = tokenizer(list(texts), add_special_tokens=False, verbose=False)["input_ids"]
+    windows, owners = [], []
+    for essay_index, ids in enumerate(encoded):
+        windows_of_essay = split_windows(ids, tokenizer.cls_token_id, tokenizer.sep_token_id, window_size, overlap)
+        for window in windows_of_essay[:max_windows]:
+            windows.append(window)
+            owners.append(essay_index)
+
+    window_probs = predict_sequences(
+        windows, model, device, batch_size=batch_size, pad_token_id=tokenizer.pad_token_id, stats=stats,
+        batches=essay_batches(owners, batch_size),
+    )
+
+    per_essay = [([], []) for _ in texts]
+    for owner, window, probs in zip(owners, windows, window_probs):
+        per_essay[owner][0].append(probs)
+        per_essay[owner][1].append(len(window) - 2)
+
+    results = []
+    for probs_list, lengths in per_essay:
+        probs = aggregate_windows(probs_list, lengths, strategy)
+        label = int(probs.argmax())
+        results.append((label, float(probs[label]), probs))
+    return results
@@ -0,0 +1,221 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Near-duplicate detection settings, overridable through the environment
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SIMILARITY_INDEX_DIR = os.environ.get("SIMILARITY_INDEX_DIR", "similarity_index")
+SIMILARITY_MAX_ITEMS = int(os.environ.get("SIMILARITY_MAX_ITEMS", 50000))
+# Above this many stored essays, search goes through random-hyperplane LSH instead of a full scan
+LSH_MIN_ITEMS = int(os.environ.get("LSH_MIN_ITEMS", 20000))
+LSH_TABLES = 8
+LSH_BITS = 12
+KEY_BYTES = 160
+
+
+def load_encoder(model_name=EMBEDDING_MODEL):
+    # Imported here so the sentence-transformers package is only loaded when the index is enabled
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def embed(encoder, texts):
+    """Unit-length float32 embeddings, so a dot product is the cosine similarity"""
+    return encoder.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+class SimilarityIndex:
+    """Bounded nearest-neighbour index over essay embeddings, persisted as memory-mapped arrays.
+
+    Embeddings fill a fixed (capacity, dim) matrix as a ring buffer, so the oldest
+    essay is overwritten once the index is full. Each slot carries an opaque key
+    (up to KEY_BYTES) naming the stored essay's cached results. Small indexes are
+    scanned with one matrix-vector product; large ones are narrowed down with LSH
+    buckets first and only the candidates are compared exactly.
+
+    A persisted index can be shared by several processes: the insert counter that
+    allocates slots lives in the mapped files too, and inserts (exclusive) and
+    searches (shared) hold an flock on the index directory.
+    """
+
+    def __init__(self, dim, path=None, capacity=SIMILARITY_MAX_ITEMS, model_name=EMBEDDING_MODEL,
+                 lsh_min_items=LSH_MIN_ITEMS, lsh_tables=LSH_TABLES, lsh_bits=LSH_BITS, seed=0):
+        self.dim = dim
+        self.capacity = capacity
+        self.lsh_min_items = lsh_min_items
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._lock_pid = None
+        self.stats = {"searches": 0, "matches": 0, "inserts": 0, "evictions": 0}
+
+        header = {"model": model_name, "dim": dim, "capacity": capacity}
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with self._file_lock(fcntl.LOCK_EX):
+                state_path = self.path / "index.json"
+                reuse = False
+                if state_path.exists() and (self.path / "inserts.i64").exists():
+                    with open(state_path) as f:
+                        state = json.load(f)
+                    # An index built with another encoder or size is unusable; start over
+                    reuse = all(state.get(name) == value for name, value in header.items())
+                mode = "r+" if reuse else "w+"
+                self.vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode=mode, shape=(capacity, dim))
+                self.keys = np.memmap(self.path / "keys.bin", dtype=f"S{KEY_BYTES}", mode=mode, shape=(capacity,))
+                # Total inserts ever made, shared by every process using the index; slot = inserts % capacity
+                self._inserts = np.memmap(self.path / "inserts.i64", dtype=np.int64, mode=mode, shape=(1,))
+                if not reuse:
+                    tmp_path = self.path / "index.json.tmp"
+                    with open(tmp_path, "w") as f:
+                        json.dump(header, f)
+                    os.replace(tmp_path, state_path)
+        else:
+            self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+            self.keys = np.zeros(capacity, dtype=f"S{KEY_BYTES}")
+            self._inserts = np.zeros(1, dtype=np.int64)
+
+        # Random hyperplanes: essays whose embeddings fall on the same side of every plane share a bucket
+        planes = np.random.default_rng(seed).standard_normal((lsh_tables, lsh_bits, dim)).astype(np.float32)
+        self._planes = planes
+        self._powers = (1 << np.arange(lsh_bits)).astype(np.int64)
+        self._codes = None
+        self._buckets = None
+        # Inserts (from any process) already reflected in this process's LSH buckets
+        self._hashed = 0
+
+    @property
+    def count(self):
+        return min(int(self._inserts[0]), self.capacity)
+
+    def __len__(self):
+        return self.count
+
+    @contextmanager
+    def _file_lock(self, operation):
+        if self.path is None:
+            yield
+            return
+        # flock locks belong to the open file, so a forked child must open its own
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self.path / "index.lock", "a")
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _hash(self, vectors):
+        # (n, tables) bucket codes
+        bits = np.einsum("tbd,nd->ntb", self._planes, vectors) > 0
+        return bits.astype(np.int64) @ self._powers
+
+    def _build_lsh(self):
+        self._hashed = int(self._inserts[0])
+        count = min(self._hashed, self.capacity)
+        self._codes = np.zeros((self.capacity, len(self._planes)), dtype=np.int64)
+        self._codes[:count] = self._hash(np.asarray(self.vectors[:count]))
+        self._buckets = [{} for _ in self._planes]
+        for slot in range(count):
+            self._bucket_add(slot)
+
+    def _sync_lsh(self):
+        # Bring the buckets up to date with slots written since they were last touched, by any process
+        inserts = int(self._inserts[0])
+        if self._buckets is None:
+            if min(inserts, self.capacity) >= self.lsh_min_items:
+                self._build_lsh()
+            return
+        if inserts - self._hashed > self.capacity:
+            self._build_lsh()
+            return
+        for insert in range(self._hashed, inserts):
+            slot = insert % self.capacity
+            if insert >= self.capacity:
+                self._bucket_remove(slot)
+            self._codes[slot] = self._hash(np.asarray(self.vectors[slot])[None, :])[0]
+            self._bucket_add(slot)
+        self._hashed = inserts
+
+    def _bucket_add(self, slot):
+        for table, code in enumerate(self._codes[slot]):
+            self._buckets[table].setdefault(int(code), set()).add(slot)
+
+    def _bucket_remove(self, slot):
+        for table, code in enumerate(self._codes[slot]):
+            self._buckets[table].get(int(code), set()).discard(slot)
+
+    def search(self, vector, threshold):
+        """Return (key, similarity) of the most similar stored essay at or above threshold, else None"""
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self.stats["searches"] += 1
+            count = self.count
+            if count == 0:
+                return None
+            self._sync_lsh()
+            if self._buckets is not None:
+                codes = self._hash(vector[None, :])[0]
+                candidates = set()
+                for table, code in enumerate(codes):
+                    candidates |= self._buckets[table].get(int(code), set())
+                if not candidates:
+                    return None
+                slots = np.fromiter(candidates, dtype=np.int64)
+                similarities = self.vectors[slots] @ vector
+            else:
+                slots = None
+                similarities = self.vectors[:count] @ vector
+
+            best = int(similarities.argmax())
+            similarity = float(similarities[best])
+            if similarity < threshold:
+                return None
+            slot = int(slots[best]) if slots is not None else best
+            self.stats["matches"] += 1
+            return self.keys[slot].decode(), similarity
+
+    def add(self, vector, key):
+        """Store an embedding, overwriting the oldest one when the index is full"""
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            inserts = int(self._inserts[0])
+            slot = inserts % self.capacity
+            if inserts >= self.capacity:
+                self.stats["evictions"] += 1
+            self.vectors[slot] = vector
+            self.keys[slot] = key.encode()[:KEY_BYTES]
+            # Published last, so other processes never see the slot before its vector and key
+            self._inserts[0] = inserts + 1
+            self.stats["inserts"] += 1
+            self._sync_lsh()
+            return slot
+
+    def retire(self, key):
+        """Blank every slot stored under key, so it can no longer match; returns how many were found"""
+        encoded = key.encode()[:KEY_BYTES]
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            slots = np.flatnonzero(self.keys[:self.count] == encoded)
+            # A zero vector has similarity 0 to everything, so stale LSH entries in other processes lose too
+            self.vectors[slots] = 0
+            self.keys[slots] = b""
+            return len(slots)
+
+    def flush(self):
+        """Write the mapped arrays to disk"""
+        if self.path is None:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self.vectors.flush()
+            self.keys.flush()
+            self._inserts.flush()
+
+    def summary(self):
+        with self._lock:
+            count = self.count
+            return {"size": count, "capacity": self.capacity,
+                    "search": "lsh" if count >= self.lsh_min_items else "exact", **self.stats}
@@ -0,0 +1,171 @@
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def lazy_import(name):
+    """Return a module whose import is deferred until one of its attributes is first used"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class ModelPreloader:
+    """Loads models on a background thread and reports readiness for health probes"""
+
+    def __init__(self, load_fn, name="models"):
+        self.load_fn = load_fn
+        self.name = name
+        self.error = None
+        self.load_seconds = None
+        self._ready = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready.is_set() and self.error is None
+
+    def start(self):
+        """Begin loading in the background; later calls are no-ops"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._load, name=f"preload-{self.name}", daemon=True).start()
+
+    def wait(self, timeout=None, retry=False):
+        """Start loading if needed and block until it finishes, re-raising any load error.
+
+        With retry=True a previous failed load is started over instead of re-raised.
+        """
+        with self._lock:
+            if retry and self.error is not None and self._ready.is_set():
+                self.error = None
+                self._ready.clear()
+                self._started = False
+        self.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"{self.name} did not finish loading within {timeout} seconds")
+        if self.error is not None:
+            raise RuntimeError(f"Failed to load {self.name}: {self.error}")
+
+    def status(self):
+        if self.error is not None:
+            state = "failed"
+        elif self._ready.is_set():
+            state = "ready"
+        else:
+            state = "loading" if self._started else "not_started"
+        return {"status": state, "load_seconds": self.load_seconds, "error": self.error}
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            self.load_fn()
+        except Exception as e:
+            self.error = str(e)
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        self._ready.set()
+
+
+# Code run in a fresh interpreter for each entry point: prints import and first-prediction timings
+_BENCH_SCRIPTS = {
+    "api": """
+import sys, time
+sys.path.insert(0, {root!r})
+from mock_hf_server import start_mock_server
+server, base_url = start_mock_server()
+import os
+os.environ.update(HF_API_BASE=base_url, HF_API_TOKEN="bench")
+started = time.perf_counter()
+sys.path.insert(0, {root!r} + "/api")
+import index
+imported = time.perf_counter()
+index.analyze("A short essay used to time the first prediction.")
+predicted = time.perf_counter()
+""",
+    "app": """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.load_models()
+app.predict_score("A short essay used to time the first prediction.")
+predicted = time.perf_counter()
+""",
+    "scoring": """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from scoring import load_model, predict_batch
+imported = time.perf_counter()
+tokenizer, model = load_model()
+predict_batch(["A short essay used to time the first prediction."], tokenizer, model)
+predicted = time.perf_counter()
+""",
+}
+
+_BENCH_REPORT = """
+import json
+print("BENCH " + json.dumps({"import_seconds": imported - started, "first_prediction_seconds": predicted - imported}))
+"""
+
+
+def benchmark_entry_point(name, repeat=3):
+    """Time interpreter start, import and first prediction for an entry point in fresh processes"""
+    script = _BENCH_SCRIPTS[name].format(root=ROOT) + _BENCH_REPORT
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=ROOT)
+        wall = time.perf_counter() - started
+        lines = [line for line in result.stdout.splitlines() if line.startswith("BENCH ")]
+        if result.returncode != 0 or not lines:
+            return {"entry_point": name, "error": (result.stderr.strip().splitlines() or ["unknown error"])[-1]}
+        runs.append({**json.loads(lines[-1][len("BENCH "):]), "process_seconds": wall})
+
+    best = {key: round(min(run[key] for run in runs), 4) for key in runs[0]}
+    return {"entry_point": name, "runs": len(runs), **best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time and time-to-first-prediction")
+    parser.add_argument("--entry-points", nargs="+", choices=sorted(_BENCH_SCRIPTS), default=["api", "app", "scoring"],
+                        help="Entry points to benchmark (default: all)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Fresh processes per entry point; the fastest run is reported (default: 3)")
+    parser.add_argument("--output", default="startup_bench.json",
+                        help="File to write the JSON results to (default: startup_bench.json)")
+    args = parser.parse_args()
+
+    results = [benchmark_entry_point(name, args.repeat) for name in args.entry_points]
+    for result in results:
+        if "error" in result:
+            print(f"{result['entry_point']}: failed - {result['error']}")
+        else:
+            print(f"{result['entry_point']}: import {result['import_seconds']:.3f}s, "
+                  f"first prediction {result['first_prediction_seconds']:.3f}s, "
+                  f"process {result['process_seconds']:.3f}s")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
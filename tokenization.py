@@ -0,0 +1,135 @@
+import argparse
+import hashlib
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from transformers import BertTokenizer, BertTokenizerFast
+
+# Tokenizer settings, overridable through the environment
+TOKENIZER_BACKEND = os.environ.get("TOKENIZER_BACKEND", "fast")
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 4096))
+TOKENIZER_WORKERS = int(os.environ.get("TOKENIZER_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Inputs that tend to expose differences between the Python and Rust WordPiece implementations
+VERIFY_SAMPLES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Café naïve résumé – coöperate “quoted” ‘text’…",
+    "Tabs\tand\nnewlines\r\nand   repeated   spaces",
+    "Numbers like 3.14, 1,000,000 and 2nd/3rd place!",
+    "Supercalifragilisticexpialidocious antidisestablishmentarianism",
+    "中文字符 and emoji 😀 mixed with ASCII",
+    "Don't won't can't y'all o'clock e-mail re-enter",
+    "",
+]
+
+
+def verify_tokenizers(slow, fast, texts=VERIFY_SAMPLES):
+    """Return the texts whose token ids differ between the slow and fast tokenizers"""
+    slow_ids = [slow(text)["input_ids"] for text in texts]
+    fast_ids = fast(list(texts))["input_ids"]
+    return [text for text, a, b in zip(texts, slow_ids, fast_ids) if a != b]
+
+
+def load_tokenizer(model_path, backend=TOKENIZER_BACKEND):
+    """Load the Rust-backed fast tokenizer, falling back to the vocab.txt tokenizer if outputs differ"""
+    slow = BertTokenizer.from_pretrained(model_path)
+    if backend != "fast":
+        return slow
+    fast = BertTokenizerFast.from_pretrained(model_path)
+    mismatches = verify_tokenizers(slow, fast)
+    if mismatches:
+        print(f"WARNING: fast tokenizer differs from vocab.txt tokenizer on {len(mismatches)} samples; using slow tokenizer")
+        return slow
+    return fast
+
+
+class TokenizationStage:
+    """Drop-in tokenizer wrapper for the scoring path: cached, pool-parallel batch encoding.
+
+    Calls with a list of texts and no `return_tensors` return {"input_ids": [...]}
+    like the wrapped tokenizer, serving repeated essays from an LRU cache of token
+    ids keyed by text hash; anything else is passed straight to the tokenizer.
+    """
+
+    def __init__(self, tokenizer, cache_size=TOKEN_CACHE_SIZE, workers=TOKENIZER_WORKERS):
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tokenizer") if workers > 1 else None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+    def __call__(self, texts, return_tensors=None, **kwargs):
+        if return_tensors is not None or isinstance(texts, str):
+            return self.tokenizer(texts, return_tensors=return_tensors, **kwargs)
+        return {"input_ids": self.encode(list(texts), **kwargs)}
+
+    def encode(self, texts, **kwargs):
+        settings = repr(sorted(kwargs.items()))
+        keys = [hashlib.sha256(f"{settings}\0{text}".encode("utf-8")).digest() for text in texts]
+
+        results = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                ids = self._cache.get(key)
+                if ids is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = ids.tolist()
+            missing = [i for i, ids in enumerate(results) if ids is None]
+            self.stats["hits"] += len(texts) - len(missing)
+            self.stats["misses"] += len(missing)
+
+        if missing:
+            encoded = self._encode_parallel([texts[i] for i in missing], kwargs)
+            with self._lock:
+                for i, ids in zip(missing, encoded):
+                    results[i] = ids
+                    self._cache[keys[i]] = array("I", ids)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def _encode_parallel(self, texts, kwargs):
+        # Shard large batches across the pool; the fast tokenizer releases the GIL while encoding
+        if self._executor is None or len(texts) < 2 * self.workers:
+            return self.tokenizer(texts, **kwargs)["input_ids"]
+        shard = (len(texts) + self.workers - 1) // self.workers
+        shards = [texts[i:i + shard] for i in range(0, len(texts), shard)]
+        encoded = []
+        for result in self._executor.map(lambda part: self.tokenizer(part, **kwargs)["input_ids"], shards):
+            encoded.extend(result)
+        return encoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the fast tokenizer matches the vocab.txt tokenizer")
+    parser.add_argument("--essays", help="CSV or JSONL file of essays to compare in addition to the built-in samples")
+    parser.add_argument("--text-field", default="text",
+                        help="Column or key holding the essay text (default: text)")
+    parser.add_argument("--limit", type=int, default=1000,
+                        help="Number of essays to compare (default: 1000)")
+    args = parser.parse_args()
+
+    from scoring import MODEL_PATH
+
+    texts = list(VERIFY_SAMPLES)
+    if args.essays:
+        from bulk import read_essays
+        texts += [text for _, text in islice(read_essays(args.essays, args.text_field), args.limit)]
+
+    mismatches = verify_tokenizers(BertTokenizer.from_pretrained(MODEL_PATH), BertTokenizerFast.from_pretrained(MODEL_PATH), texts)
+    print(f"{len(texts) - len(mismatches)}/{len(texts)} texts tokenized identically")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()